@@ -0,0 +1,80 @@
+import logging
+import threading
+import time
+from typing import Dict, FrozenSet, Tuple
+
+from telegram import Bot, ChatMember, ChatMemberUpdated
+
+logger = logging.getLogger(__name__)
+
+ADMIN_STATUSES = (ChatMember.ADMINISTRATOR, ChatMember.CREATOR)
+
+
+class ChatAdminCache:
+    """Per-chat set of administrator ids.
+
+    A chat's admins are fetched once with get_chat_administrators and then
+    kept current from chat_member updates. Entries older than ``ttl`` are
+    still served while a refresh runs in the background, so the moderation
+    path only pays for a network call the very first time a chat is seen.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._admins: Dict[int, Tuple[FrozenSet[int], float]] = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def is_admin(self, bot: Bot, chat_id: int, user_id: int) -> bool:
+        """Check whether ``user_id`` administers ``chat_id``"""
+        entry = self._admins.get(chat_id)
+        if entry is None:
+            return user_id in self.refresh(bot, chat_id)
+        admins, fetched_at = entry
+        if time.monotonic() - fetched_at > self.ttl:
+            self._refresh_in_background(bot, chat_id)
+        return user_id in admins
+
+    def refresh(self, bot: Bot, chat_id: int) -> FrozenSet[int]:
+        """Fetch the chat's administrators from the Bot API and cache them"""
+        try:
+            admins = frozenset(member.user.id for member in bot.get_chat_administrators(chat_id))
+        except Exception as e:
+            logger.error("Error fetching administrators for chat %s: %s", chat_id, e)
+            # Cache the failure too, otherwise every message would retry the call
+            admins = self._admins.get(chat_id, (frozenset(), 0))[0]
+        self._admins[chat_id] = (admins, time.monotonic())
+        return admins
+
+    def _refresh_in_background(self, bot: Bot, chat_id: int):
+        with self._lock:
+            if chat_id in self._refreshing:
+                return
+            self._refreshing.add(chat_id)
+
+        def run():
+            try:
+                self.refresh(bot, chat_id)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(chat_id)
+
+        threading.Thread(target=run, name=f"admin-refresh-{chat_id}", daemon=True).start()
+
+    def apply_update(self, chat_member: ChatMemberUpdated):
+        """Update a cached chat from a chat_member update without an API call"""
+        chat_id = chat_member.chat.id
+        entry = self._admins.get(chat_id)
+        if entry is None:
+            return
+        admins, fetched_at = entry
+        user_id = chat_member.new_chat_member.user.id
+        if chat_member.new_chat_member.status in ADMIN_STATUSES:
+            admins = admins | {user_id}
+        else:
+            admins = admins - {user_id}
+        self._admins[chat_id] = (admins, fetched_at)
+
+    def invalidate(self, chat_id: int):
+        """Forget a chat so its admins are fetched again on next use"""
+        self._admins.pop(chat_id, None)
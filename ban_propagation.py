@@ -0,0 +1,87 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+from telegram.error import BadRequest, RetryAfter, TelegramError, Unauthorized
+
+from rate_limit import TokenBucketLimiter
+
+logger = logging.getLogger(__name__)
+
+_DONE, _FAILED, _SKIPPED = 'done', 'failed', 'skipped'
+
+
+class BanPropagator:
+    """Applies queued global ban/unban actions with a bounded worker pool.
+
+    At most ``workers`` API calls run at once and together they start no more
+    than ``rate`` calls per second. Progress lives in the caller's queue (the
+    global_ban_queue table): ``run`` only reports which tasks finished, so an
+    interrupted run simply resumes from what is still queued.
+
+    A flood-control RetryAfter stops the run; tasks not yet attempted are left
+    untouched and ``paused_until`` says when the next run may start.
+    """
+
+    def __init__(self, workers: int, rate: float):
+        self.rate = rate
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='gban')
+        self._limiter = TokenBucketLimiter(rate, workers)
+        self._running = threading.Lock()
+        self._stop = threading.Event()
+        self.paused_until = 0.0
+
+    def _apply(self, bot, task: Tuple[int, int, str, int]) -> str:
+        user_id, chat_id, action, _ = task
+        while not self._limiter.allow('api'):
+            if self._stop.is_set():
+                return _SKIPPED
+            time.sleep(1 / self.rate)
+        if self._stop.is_set():
+            return _SKIPPED
+        try:
+            if action == 'ban':
+                bot.ban_chat_member(chat_id, user_id)
+            else:
+                bot.unban_chat_member(chat_id, user_id, only_if_banned=True)
+            return _DONE
+        except RetryAfter as e:
+            self.paused_until = max(self.paused_until, time.monotonic() + e.retry_after)
+            self._stop.set()
+            return _SKIPPED
+        except (BadRequest, Unauthorized) as e:
+            # Chat gone, bot removed or lacking rights, target is an admin: retrying won't help
+            logger.warning("Global %s of user %s in chat %s not applied: %s", action, user_id, chat_id, e)
+            return _DONE
+        except TelegramError as e:
+            logger.warning("Global %s of user %s in chat %s failed: %s", action, user_id, chat_id, e)
+            return _FAILED
+
+    def run(self, bot, tasks: Sequence[Tuple[int, int, str, int]]
+            ) -> Optional[Tuple[List[Tuple[int, int, str]], List[Tuple[int, int, str]]]]:
+        """Apply (user_id, chat_id, action, attempts) tasks; return the (user_id, chat_id, action)
+        of those done and of those that failed.
+
+        Returns None without doing anything if a run is already in progress or
+        flood control is still in effect.
+        """
+        if time.monotonic() < self.paused_until or not self._running.acquire(blocking=False):
+            return None
+        try:
+            self._stop.clear()
+            results = self._executor.map(lambda task: self._apply(bot, task), tasks)
+            done, failed = [], []
+            for task, result in zip(tasks, results):
+                if result == _DONE:
+                    done.append(task[:3])
+                elif result == _FAILED:
+                    failed.append(task[:3])
+            return done, failed
+        finally:
+            self._running.release()
+
+    def shutdown(self):
+        self._stop.set()
+        self._executor.shutdown(wait=True)
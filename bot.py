@@ -1,8 +1,8 @@
 import logging
 import os
 from telegram import Update, Bot
-from telegram.ext import Updater, CommandHandler, MessageHandler, Filters
-from config import BOT_TOKEN
+from telegram.ext import Updater, CommandHandler, MessageHandler, ChatMemberHandler, Filters
+from config import BOT_TOKEN, SEEN_FLUSH_INTERVAL, EXPIRY_SWEEP_INTERVAL, RAID_CHECK_INTERVAL, GBAN_INTERVAL
 from handlers import (
     start_command,
     help_command,
@@ -12,15 +12,49 @@ from handlers import (
     addsudo_command,
     removesudo_command,
     status_command,
+    members_command,
+    settings_command,
+    set_command,
+    allowmedia_command,
+    disallowmedia_command,
+    blockmedia_command,
+    unblockmedia_command,
+    blockdomain_command,
+    allowdomain_command,
+    removedomain_command,
+    domains_command,
+    allowchannel_command,
+    denychannel_command,
+    removechannel_command,
+    channels_command,
+    addrule_command,
+    shadowrule_command,
+    delrule_command,
+    enablerule_command,
+    promoterule_command,
+    rules_command,
+    warns_command,
+    lockdown_command,
+    purge_command,
+    resetwarns_command,
+    gban_command,
+    ungban_command,
+    gbans_command,
+    gban_propagation_job,
+    ban_propagator,
+    flush_seen_users_job,
+    flush_warning_points_job,
+    raid_check_job,
+    revoke_expired_approvals_job,
     handle_message,
-    handle_edited_message
+    handle_edited_message,
+    handle_chat_member
 )
 
-# Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+from logging_setup import setup_logging, shutdown_logging
+
+# Configure logging (records are written by a background listener thread)
+setup_logging()
 
 logger = logging.getLogger(__name__)
 
@@ -38,6 +72,37 @@ def main():
     dispatcher.add_handler(CommandHandler("addsudo", addsudo_command))
     dispatcher.add_handler(CommandHandler("removesudo", removesudo_command))
     dispatcher.add_handler(CommandHandler("status", status_command))
+    dispatcher.add_handler(CommandHandler("members", members_command))
+    dispatcher.add_handler(CommandHandler("settings", settings_command))
+    dispatcher.add_handler(CommandHandler("set", set_command))
+    dispatcher.add_handler(CommandHandler("allowmedia", allowmedia_command))
+    dispatcher.add_handler(CommandHandler("disallowmedia", disallowmedia_command))
+    dispatcher.add_handler(CommandHandler("blockmedia", blockmedia_command))
+    dispatcher.add_handler(CommandHandler("unblockmedia", unblockmedia_command))
+    dispatcher.add_handler(CommandHandler("blockdomain", blockdomain_command))
+    dispatcher.add_handler(CommandHandler("allowdomain", allowdomain_command))
+    dispatcher.add_handler(CommandHandler("removedomain", removedomain_command))
+    dispatcher.add_handler(CommandHandler("domains", domains_command))
+    dispatcher.add_handler(CommandHandler("allowchannel", allowchannel_command))
+    dispatcher.add_handler(CommandHandler("denychannel", denychannel_command))
+    dispatcher.add_handler(CommandHandler("removechannel", removechannel_command))
+    dispatcher.add_handler(CommandHandler("channels", channels_command))
+    dispatcher.add_handler(CommandHandler("addrule", addrule_command))
+    dispatcher.add_handler(CommandHandler("shadowrule", shadowrule_command))
+    dispatcher.add_handler(CommandHandler("delrule", delrule_command))
+    dispatcher.add_handler(CommandHandler("enablerule", enablerule_command))
+    dispatcher.add_handler(CommandHandler("promoterule", promoterule_command))
+    dispatcher.add_handler(CommandHandler("rules", rules_command))
+    dispatcher.add_handler(CommandHandler("warns", warns_command))
+    dispatcher.add_handler(CommandHandler("lockdown", lockdown_command))
+    dispatcher.add_handler(CommandHandler("purge", purge_command))
+    dispatcher.add_handler(CommandHandler("gban", gban_command))
+    dispatcher.add_handler(CommandHandler("ungban", ungban_command))
+    dispatcher.add_handler(CommandHandler("gbans", gbans_command))
+    dispatcher.add_handler(CommandHandler("resetwarns", resetwarns_command))
+
+    # Keep the chat administrator cache current
+    dispatcher.add_handler(ChatMemberHandler(handle_chat_member, ChatMemberHandler.ANY_CHAT_MEMBER))
 
     # Add message handler for edited messages
     dispatcher.add_handler(MessageHandler(
@@ -51,6 +116,18 @@ def main():
         handle_message
     ))
 
+    # Persist the seen-users directory in periodic batches
+    updater.job_queue.run_repeating(flush_seen_users_job, interval=SEEN_FLUSH_INTERVAL, first=SEEN_FLUSH_INTERVAL)
+    updater.job_queue.run_repeating(flush_warning_points_job, interval=SEEN_FLUSH_INTERVAL, first=SEEN_FLUSH_INTERVAL)
+
+    # Revoke expired time-limited approvals in a single periodic sweep
+    updater.job_queue.run_repeating(revoke_expired_approvals_job, interval=EXPIRY_SWEEP_INTERVAL, first=0)
+
+    # Lift raid lockdowns once the join rate has fallen
+    updater.job_queue.run_repeating(raid_check_job, interval=RAID_CHECK_INTERVAL, first=RAID_CHECK_INTERVAL)
+    # Apply queued global bans; the queue is in the database, so this resumes after a restart
+    updater.job_queue.run_repeating(gban_propagation_job, interval=GBAN_INTERVAL, first=GBAN_INTERVAL)
+
     # Start the bot
     logger.info("Starting bot...")
     
@@ -64,15 +141,20 @@ def main():
             listen="0.0.0.0",
             port=PORT,
             url_path=BOT_TOKEN,
-            webhook_url=f"{RENDER_EXTERNAL_URL}/{BOT_TOKEN}"
+            webhook_url=f"{RENDER_EXTERNAL_URL}/{BOT_TOKEN}",
+            allowed_updates=Update.ALL_TYPES  # chat_member updates are opt-in
         )
-        logger.info(f"Bot started on Render with webhook on port {PORT}")
+        logger.info("Bot started on Render with webhook on port %s", PORT)
     else:
         # Local development, use polling
-        updater.start_polling()
+        updater.start_polling(allowed_updates=Update.ALL_TYPES)  # chat_member updates are opt-in
         logger.info("Bot started locally with polling")
     
     updater.idle()
+    ban_propagator.shutdown()
+    flush_seen_users_job(None)
+    flush_warning_points_job(None)
+    shutdown_logging()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
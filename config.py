@@ -48,9 +48,82 @@ Action: Message edited and deleted
 Status: Security protocol activated
 """
 
+# Logging configuration
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()  # 'text' or 'json'
+LOG_SAMPLE_EVERY = int(os.environ.get('LOG_SAMPLE_EVERY', '100'))  # Keep 1 in N per-update debug records
+
 # Database configuration
 DATABASE_URL = os.environ.get('DATABASE_URL', 'sqlite:///bot.db')
 
+# Negative lookup cache for unapproved/non-sudo users
+NEGATIVE_CACHE_SIZE = int(os.environ.get('NEGATIVE_CACHE_SIZE', '50000'))
+NEGATIVE_CACHE_TTL = int(os.environ.get('NEGATIVE_CACHE_TTL', '600'))  # seconds
+
+# Positive approval cache (stores each approval's expiry) and expiry sweep
+APPROVAL_CACHE_SIZE = int(os.environ.get('APPROVAL_CACHE_SIZE', '10000'))
+APPROVAL_CACHE_TTL = int(os.environ.get('APPROVAL_CACHE_TTL', '3600'))  # seconds
+EXPIRY_SWEEP_INTERVAL = int(os.environ.get('EXPIRY_SWEEP_INTERVAL', '300'))  # seconds
+
+# Chat administrator cache refresh interval
+ADMIN_CACHE_TTL = int(os.environ.get('ADMIN_CACHE_TTL', '3600'))  # seconds
+
+# Known-bad media learning: block a file once it is deleted in this many chats within the window
+AUTO_BLOCK_CHAT_THRESHOLD = int(os.environ.get('AUTO_BLOCK_CHAT_THRESHOLD', '3'))
+AUTO_BLOCK_WINDOW = int(os.environ.get('AUTO_BLOCK_WINDOW', '3600'))  # seconds
+
+# Cross-chat near-duplicate text spam detection
+DUPLICATE_FILTER = os.environ.get('DUPLICATE_FILTER', 'on').lower() in ('1', 'on', 'true', 'yes')
+DUPLICATE_WINDOW = int(os.environ.get('DUPLICATE_WINDOW', '600'))  # seconds
+DUPLICATE_BURST_CHATS = int(os.environ.get('DUPLICATE_BURST_CHATS', '3'))  # distinct chats to count as a burst
+DUPLICATE_MAX_ENTRIES = int(os.environ.get('DUPLICATE_MAX_ENTRIES', '20000'))
+
+# Local spam classifier (see spam_classifier.py); disabled when the model file is missing
+SPAM_MODEL_PATH = os.environ.get('SPAM_MODEL_PATH', 'spam_model.npz')
+SPAM_THRESHOLD = float(os.environ.get('SPAM_THRESHOLD', '0.95'))  # Minimum spam probability to delete
+
+# Operator regex filter rules: per-rule CPU time budget per 1000 characters of a message
+# (shorter messages get the full budget), and overruns before a rule is disabled
+RULE_TIME_BUDGET_MS = float(os.environ.get('RULE_TIME_BUDGET_MS', '10'))
+RULE_MAX_STRIKES = int(os.environ.get('RULE_MAX_STRIKES', '3'))
+
+# Warning points: half-life of a violation's point, and how long an escalation mute lasts
+WARN_HALF_LIFE = int(os.environ.get('WARN_HALF_LIFE', '86400'))  # seconds
+WARN_MUTE_DURATION = int(os.environ.get('WARN_MUTE_DURATION', '3600'))  # seconds
+
+# Join-raid detection: joins are counted over RAID_WINDOW (the threshold is a per-chat setting);
+# a lockdown lasts at least RAID_MIN_LOCKDOWN and mutes raiders for RAID_MUTE_DURATION
+RAID_WINDOW = int(os.environ.get('RAID_WINDOW', '60'))  # seconds
+RAID_MIN_LOCKDOWN = int(os.environ.get('RAID_MIN_LOCKDOWN', '300'))  # seconds
+RAID_MUTE_DURATION = int(os.environ.get('RAID_MUTE_DURATION', '86400'))  # seconds
+RAID_CHECK_INTERVAL = int(os.environ.get('RAID_CHECK_INTERVAL', '15'))  # seconds
+
+# Recent message ids kept per chat (for /purge by user and edit classification), and in total across chats
+MESSAGE_LOG_PER_CHAT = int(os.environ.get('MESSAGE_LOG_PER_CHAT', '500'))
+MESSAGE_LOG_MAX = int(os.environ.get('MESSAGE_LOG_MAX', '100000'))
+
+# /purge limits: messages per purge, and pause between 100-message delete batches
+PURGE_MAX_MESSAGES = int(os.environ.get('PURGE_MAX_MESSAGES', '1000'))
+PURGE_BATCH_DELAY = float(os.environ.get('PURGE_BATCH_DELAY', '1'))  # seconds
+
+# Global ban propagation: concurrent API calls, calls per second across them,
+# queued chats taken per run, run interval and attempts before a chat is given up
+GBAN_WORKERS = int(os.environ.get('GBAN_WORKERS', '4'))
+GBAN_RATE = float(os.environ.get('GBAN_RATE', '10'))
+GBAN_BATCH_SIZE = int(os.environ.get('GBAN_BATCH_SIZE', '200'))
+GBAN_INTERVAL = int(os.environ.get('GBAN_INTERVAL', '30'))  # seconds
+GBAN_MAX_ATTEMPTS = int(os.environ.get('GBAN_MAX_ATTEMPTS', '5'))
+
+# Command rate limits (token buckets): sustained commands per minute and burst size,
+# per user and per chat. The bot admin and sudo users are exempt.
+COMMAND_USER_RATE = float(os.environ.get('COMMAND_USER_RATE', '6'))
+COMMAND_USER_BURST = int(os.environ.get('COMMAND_USER_BURST', '3'))
+COMMAND_CHAT_RATE = float(os.environ.get('COMMAND_CHAT_RATE', '20'))
+COMMAND_CHAT_BURST = int(os.environ.get('COMMAND_CHAT_BURST', '10'))
+
+# Seen-users directory write-behind interval
+SEEN_FLUSH_INTERVAL = int(os.environ.get('SEEN_FLUSH_INTERVAL', '30'))  # seconds
+
 # Bot configuration
 BOT_COMMANDS = [
     ("start", "Start the bot"),
@@ -60,7 +133,35 @@ BOT_COMMANDS = [
     ("disapprove", "Disapprove a user (Admin/Sudo only)"),
     ("addsudo", "Add sudo user (Owner only)"),
     ("removesudo", "Remove sudo user (Owner only)"),
-    ("status", "Check your approval status")
+    ("status", "Check your approval status"),
+    ("members", "List recently seen members (Admin/Sudo only)"),
+    ("settings", "Show this chat's moderation settings"),
+    ("set", "Change a chat setting (Chat admin/Sudo only)"),
+    ("allowmedia", "Allow a sticker set or GIF for everyone (Chat admin/Sudo only)"),
+    ("disallowmedia", "Remove a sticker set or GIF from the allowlist (Chat admin/Sudo only)"),
+    ("blockmedia", "Block a media file in every chat (Owner only)"),
+    ("unblockmedia", "Unblock a media file (Owner only)"),
+    ("blockdomain", "Block links to a domain (Chat admin/Sudo only)"),
+    ("allowdomain", "Allow links to a domain (Chat admin/Sudo only)"),
+    ("removedomain", "Remove a domain rule (Chat admin/Sudo only)"),
+    ("domains", "Show link policy, domain rules and counters"),
+    ("allowchannel", "Always allow forwards from a channel (Chat admin/Sudo only)"),
+    ("denychannel", "Always delete forwards from a channel (Chat admin/Sudo only)"),
+    ("removechannel", "Remove a channel rule (Chat admin/Sudo only)"),
+    ("channels", "Show forward policy, channel rules and counters"),
+    ("addrule", "Add a regex filter rule for every chat (Owner only)"),
+    ("shadowrule", "Add a filter rule that only records matches (Owner only)"),
+    ("promoterule", "Make a shadow filter rule live (Owner only)"),
+    ("delrule", "Delete a filter rule (Owner only)"),
+    ("enablerule", "Re-enable a disabled filter rule (Owner only)"),
+    ("rules", "List filter rules with match and CPU statistics (Owner only)"),
+    ("lockdown", "Start or end a raid lockdown (Chat admin/Sudo only)"),
+    ("purge", "Bulk-delete messages (Chat admin/Sudo only)"),
+    ("warns", "Show warning points"),
+    ("resetwarns", "Clear a user's warning points (Chat admin/Sudo only)"),
+    ("gban", "Ban a user from every moderated chat (Owner only)"),
+    ("ungban", "Lift a global ban (Owner only)"),
+    ("gbans", "Show global ban count and propagation progress (Owner only)")
 ]
 
 # Database configuration
@@ -83,8 +184,9 @@ Available Commands:
 🔹 /start - Start the bot
 🔹 /help - Show this help message
 🔹 /approve - Approve a user (Admin/Sudo only)
-   • Use: /approve <user_id/username>
-   • Or reply to a message with /approve
+   • Use: /approve <user_id/username> [duration]
+   • Or reply to a message with /approve [duration]
+   • Duration examples: 30m, 24h, 7d (omit for permanent)
 🔹 /disapprove - Disapprove a user (Admin/Sudo only)
    • Use: /disapprove <user_id/username>
    • Or reply to a message with /disapprove
@@ -95,8 +197,63 @@ Available Commands:
    • Use: /removesudo <user_id/username>
    • Or reply to a message with /removesudo
 🔹 /status - Check your approval status
+🔹 /members - List recently seen members (Admin/Sudo only)
+🔹 /settings - Show this chat's moderation settings
+🔹 /set - Change a chat setting (Chat admin/Sudo only)
+   • /set edits content|all|off - Delete edits that change content or media, or every visible edit
+   • /set copyright on|off - Copyright filter
+   • /set media all|none|voice,audio,... - Media unapproved users may send
+   • /set approvedmedia all|none|photo,video,... - Media approved users may send
+   • /set links blocklist|allowlist|off - Link moderation policy
+   • /set forwards allow|approved|block - Who may forward from channels
+   • /set invites on|off - Delete Telegram invite links
+   • /set mentions <n> - Max @mentions per message (0 = off)
+   • /set caps <percent> - Max uppercase share (0 = off)
+   • /set emoji <percent> - Max emoji share (0 = off)
+   • /set mute <points> - Mute users at this many warning points (0 = off, the default)
+   • /set kick <points> - Remove users at this many warning points (0 = off, the default)
+   • /set warnttl <seconds> - Warning auto-delete delay
+   • /set private on|off - Answer /start, /help and /status in private chat
+   • /set raid <joins> - Joins per minute that trigger a raid lockdown (0 = off, the default)
+🔹 /allowmedia - Allow a sticker set or GIF for everyone (Chat admin/Sudo only)
+   • Reply to a sticker or GIF with /allowmedia
+   • Or use: /allowmedia <sticker_set_name>
+🔹 /disallowmedia - Remove a sticker set or GIF from the allowlist (Chat admin/Sudo only)
+🔹 /blockmedia - Block a media file in every chat (Owner only)
+   • Reply to the media with /blockmedia
+   • Or use: /blockmedia <file_unique_id>
+🔹 /unblockmedia - Unblock a media file (Owner only)
+🔹 /blockdomain, /allowdomain, /removedomain - Manage link rules (Chat admin/Sudo only)
+   • Use: /blockdomain example.com (covers all subdomains)
+   • Add 'global' to apply to every chat (Owner only)
+🔹 /domains - Show link policy, domain rules and counters
+🔹 /allowchannel, /denychannel, /removechannel - Manage forward rules for a channel (Chat admin/Sudo only)
+   • Reply to a forwarded post, or use: /denychannel <channel_id>
+🔹 /channels - Show forward policy, channel rules and counters
+🔹 /lockdown on|off - Start or end a raid lockdown (Chat admin/Sudo only)
+   • During a lockdown new members are muted, their messages deleted and warnings paused
+🔹 /purge - Bulk-delete messages (Chat admin/Sudo only)
+   • Reply to a message with /purge to delete everything from it up to now
+   • Reply with /purge <n>, or use /purge <n> <user_id/username>, to delete a user's last n messages
+🔹 /warns - Show your warning points (Chat admin/Sudo: reply or give a user to check theirs)
+   • Every deleted message (or album) adds a point; points fade over time
+🔹 /resetwarns - Clear a user's warning points (Chat admin/Sudo only)
+🔹 /gban - Ban a user from every chat the bot moderates (Owner only)
+   • Use: /gban <user_id/username> [reason], or reply to a message with /gban [reason]
+   • Listed users are also banned the first time they appear in any chat
+🔹 /ungban - Lift a global ban (Owner only)
+🔹 /gbans - Show global ban count and propagation progress (Owner only)
+🔹 /addrule - Add a regex filter rule for every chat (Owner only)
+   • Use: /addrule <pattern>, e.g. /addrule (free|cheap) (crypto|usdt)
+   • Matched case-insensitively; backreferences and lookarounds are not supported
+🔹 /shadowrule - Add a rule that only records matches and CPU cost (Owner only)
+   • Review it with /rules <id>, then go live with /promoterule <id>
+🔹 /delrule, /enablerule - Delete or re-enable a filter rule by ID (Owner only)
+🔹 /rules - List filter rules with match and CPU statistics (Owner only)
+   • /rules <id> also shows recent matches
 
 Note: Sudo users can approve/disapprove users. Only the owner can manage sudo users.
+Group administrators are exempt from media and edit restrictions.
 Media messages from unapproved users will be deleted automatically.
-Edited messages are not allowed and will be deleted.
+Edits that change a message's content or media are not allowed and will be deleted.
 """
\ No newline at end of file
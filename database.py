@@ -1,11 +1,55 @@
 import sqlite3
 import logging
-from typing import Set, Optional, List, Tuple
-from config import ADMIN_ID
+from typing import Set, Optional, List, Tuple, Dict
+from collections import Counter
+from config import (
+    ADMIN_ID, NEGATIVE_CACHE_SIZE, NEGATIVE_CACHE_TTL, APPROVAL_CACHE_SIZE, APPROVAL_CACHE_TTL,
+    AUTO_BLOCK_CHAT_THRESHOLD, AUTO_BLOCK_WINDOW, RULE_TIME_BUDGET_MS, RULE_MAX_STRIKES, WARN_HALF_LIFE
+)
+from cache import TTLCache
+from domain_filter import DomainTrie
+from filter_rules import RuleSet, RuleStats
+from safe_regex import SafePattern, PatternError
+from utils import ALL_MEDIA_MASK, DEFAULT_BLOCKED_MEDIA_MASK
+from dataclasses import dataclass, replace, fields
 import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+@dataclass(frozen=True)
+class ChatSettings:
+    """Moderation policy for a single chat."""
+    delete_edits: bool = True
+    # Which edits delete_edits removes: 'content' (content/media swaps) or 'all' (cosmetic ones too)
+    edit_policy: str = 'content'
+    copyright_filter: bool = True
+    # Bitmasks of utils.MEDIA_BITS each role may send; checked with a single AND
+    unapproved_media_mask: int = ALL_MEDIA_MASK & ~DEFAULT_BLOCKED_MEDIA_MASK
+    approved_media_mask: int = ALL_MEDIA_MASK
+    warning_ttl: int = 30
+    # 'blocklist' deletes links to blocked domains, 'allowlist' deletes links to any
+    # domain not explicitly allowed, 'off' disables link moderation
+    link_policy: str = 'blocklist'
+    # Message heuristics (0 disables a threshold)
+    block_invite_links: bool = True
+    max_mentions: int = 10
+    max_caps_percent: int = 0
+    max_emoji_percent: int = 0
+    # Messages forwarded from channels: 'allow', 'approved' (approved users only) or 'block'
+    forward_policy: str = 'allow'
+    # Decaying warning points at which a user is muted / kicked (0 disables)
+    mute_threshold: int = 0
+    kick_threshold: int = 0
+    # Answer informational commands (/start, /help, /status) in the user's private chat
+    private_replies: bool = False
+    # Joins within config.RAID_WINDOW that trigger a raid lockdown (0 disables)
+    raid_threshold: int = 0
+
+DEFAULT_CHAT_SETTINGS = ChatSettings()
+# chat_settings columns are named after the ChatSettings fields
+_SETTINGS_FIELDS = fields(ChatSettings)
+
 class Database:
     _instance = None
     _lock = threading.Lock()
@@ -21,7 +65,48 @@ class Database:
         if not hasattr(self, 'initialized'):
             self.conn = None
             self.initialized = True
+            # Remembers (table, user_id) lookups that found no row, so the common
+            # "unapproved sender" case doesn't hit SQLite on every media message
+            self._negative_cache = TTLCache(NEGATIVE_CACHE_SIZE, NEGATIVE_CACHE_TTL)
+            # Approved user id -> expires_at (unix seconds, inf for permanent approvals)
+            self._approval_cache = TTLCache(APPROVAL_CACHE_SIZE, APPROVAL_CACHE_TTL)
+            # Pending @username grants waiting for the user to be seen:
+            # username -> {role: (added_by, expires_at or None)}
+            self._pending_usernames: Dict[str, Dict[str, Tuple[int, Optional[int]]]] = {}
+            # Write-behind buffer for the seen-users directory: (user_id, chat_id) -> (username, last_seen)
+            self._seen_buffer: Dict[Tuple[int, int], Tuple[Optional[str], int]] = {}
+            self._seen_lock = threading.Lock()
+            # Per-chat settings, replaced wholesale on change so readers never see partial updates
+            self._chat_settings: Dict[int, ChatSettings] = {}
+            # Per-chat media allowlists: chat_id -> {kind: frozenset(values)}
+            self._media_allowlists: Dict[int, Dict[str, frozenset]] = {}
+            # Global known-bad media (file_unique_id), plus recent deletions used to learn new entries
+            # file_unique_id -> source ('owner' or 'auto'); replaced wholesale on change
+            self._blocked_media: Dict[str, str] = {}
+            self._media_deletions = TTLCache(NEGATIVE_CACHE_SIZE, AUTO_BLOCK_WINDOW)
+            # Domain rules per chat (0 = global) and link moderation counters per (chat_id, domain)
+            self._domain_rules: Dict[int, DomainTrie] = {}
+            self._domain_hits: Counter = Counter()
+            self._stats_lock = threading.Lock()
+            # Forward source rules: chat_id -> {'allow': frozenset(ids), 'deny': frozenset(ids)},
+            # and forward counters per (chat_id, channel_id)
+            self._channel_rules: Dict[int, Dict[str, frozenset]] = {}
+            self._forward_stats: Dict[Tuple[int, int], List] = {}  # [seen, deleted, title]
+            # Warning points: (chat_id, user_id) -> (score, updated_at), decayed on access;
+            # keys changed since the last flush_warning_points() are in _dirty_warnings
+            self._warning_points: Dict[Tuple[int, int], Tuple[float, float]] = {}
+            self._dirty_warnings: Set[Tuple[int, int]] = set()
+            self._warnings_lock = threading.Lock()
+            # Globally banned user ids, enforced in every chat
+            self._global_bans: frozenset = frozenset()
+            # Compiled operator filter rules (enabled ones only)
+            self._filter_rules = RuleSet(RULE_TIME_BUDGET_MS / 1000, RULE_MAX_STRIKES)
             self.create_tables()
+            self._load_pending_usernames()
+            self._load_blocked_media()
+            self._load_domain_rules()
+            self._load_filter_rules()
+            self._load_global_bans()
             # Ensure admin is always a sudo user
             self.add_sudo_user(ADMIN_ID, "admin", ADMIN_ID)
 
@@ -48,6 +133,13 @@ class Database:
             )
         ''')
         
+        # Time-limited approvals: NULL expires_at means permanent
+        self._ensure_column(cursor, 'approved_users', 'expires_at', 'INTEGER')
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS idx_approved_users_expires_at '
+            'ON approved_users (expires_at) WHERE expires_at IS NOT NULL'
+        )
+        
         # Create sudo users table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS sudo_users (
@@ -57,22 +149,283 @@ class Database:
                 added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
+
+        # Create pending username approvals table (resolved to ids once the user is seen)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS pending_usernames (
+                username TEXT NOT NULL COLLATE NOCASE,
+                role TEXT NOT NULL,
+                added_by INTEGER,
+                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                expires_at INTEGER,
+                PRIMARY KEY (username, role)
+            )
+        ''')
+        self._ensure_column(cursor, 'pending_usernames', 'expires_at', 'INTEGER')
+
+        # Create seen users directory (who has been seen in which chat)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS seen_users (
+                user_id INTEGER NOT NULL,
+                chat_id INTEGER NOT NULL,
+                username TEXT COLLATE NOCASE,
+                last_seen INTEGER NOT NULL,
+                PRIMARY KEY (user_id, chat_id)
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_seen_users_username ON seen_users (username)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_seen_users_chat ON seen_users (chat_id, last_seen)')
+
+        # Create per-chat moderation settings table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS chat_settings (
+                chat_id INTEGER PRIMARY KEY,
+                delete_edits INTEGER NOT NULL DEFAULT 1,
+                copyright_filter INTEGER NOT NULL DEFAULT 1,
+                unapproved_media_mask INTEGER NOT NULL,
+                approved_media_mask INTEGER NOT NULL,
+                warning_ttl INTEGER NOT NULL DEFAULT 30,
+                updated_by INTEGER,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        self._ensure_column(cursor, 'chat_settings', 'link_policy', "TEXT NOT NULL DEFAULT 'blocklist'")
+        self._ensure_column(cursor, 'chat_settings', 'block_invite_links', 'INTEGER NOT NULL DEFAULT 1')
+        self._ensure_column(cursor, 'chat_settings', 'max_mentions', 'INTEGER NOT NULL DEFAULT 10')
+        self._ensure_column(cursor, 'chat_settings', 'max_caps_percent', 'INTEGER NOT NULL DEFAULT 0')
+        self._ensure_column(cursor, 'chat_settings', 'max_emoji_percent', 'INTEGER NOT NULL DEFAULT 0')
+        self._ensure_column(cursor, 'chat_settings', 'forward_policy', "TEXT NOT NULL DEFAULT 'allow'")
+        self._ensure_column(cursor, 'chat_settings', 'mute_threshold', 'INTEGER NOT NULL DEFAULT 0')
+        self._ensure_column(cursor, 'chat_settings', 'kick_threshold', 'INTEGER NOT NULL DEFAULT 0')
+        self._ensure_column(cursor, 'chat_settings', 'private_replies', 'INTEGER NOT NULL DEFAULT 0')
+        self._ensure_column(cursor, 'chat_settings', 'raid_threshold', 'INTEGER NOT NULL DEFAULT 0')
+        self._ensure_column(cursor, 'chat_settings', 'edit_policy', "TEXT NOT NULL DEFAULT 'content'")
+
+        # Create decaying warning points (the score as of updated_at)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS warning_points (
+                chat_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                score REAL NOT NULL,
+                updated_at INTEGER NOT NULL,
+                PRIMARY KEY (chat_id, user_id)
+            ) WITHOUT ROWID
+        ''')
+
+        # Create per-chat source channel rules for forwarded messages
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS channel_rules (
+                chat_id INTEGER NOT NULL,
+                channel_id INTEGER NOT NULL,
+                title TEXT,
+                rule TEXT NOT NULL,
+                added_by INTEGER,
+                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (chat_id, channel_id)
+            )
+        ''')
+
+        # Create global ban list and the per-chat propagation queue. Queue rows are
+        # removed as each chat is done, so propagation resumes after a restart.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS global_bans (
+                user_id INTEGER PRIMARY KEY,
+                reason TEXT,
+                banned_by INTEGER,
+                banned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS global_ban_queue (
+                user_id INTEGER NOT NULL,
+                chat_id INTEGER NOT NULL,
+                action TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, chat_id)
+            ) WITHOUT ROWID
+        ''')
+
+        # Create operator regex filter rules (patterns use the safe_regex subset)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS filter_rules (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                pattern TEXT NOT NULL,
+                enabled INTEGER NOT NULL DEFAULT 1,
+                disabled_reason TEXT,
+                added_by INTEGER,
+                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        # Shadow rules are evaluated and measured but never act
+        self._ensure_column(cursor, 'filter_rules', 'shadow', 'INTEGER NOT NULL DEFAULT 0')
+
+        # Create domain rules table (chat_id 0 holds global rules)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS domain_rules (
+                chat_id INTEGER NOT NULL,
+                domain TEXT NOT NULL COLLATE NOCASE,
+                rule TEXT NOT NULL,
+                added_by INTEGER,
+                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (chat_id, domain)
+            )
+        ''')
+
+        # Create per-chat media allowlist (sticker set names, animation file_unique_ids)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS media_allowlist (
+                chat_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                value TEXT NOT NULL,
+                added_by INTEGER,
+                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (chat_id, kind, value)
+            )
+        ''')
+
+        # Create global known-bad media blocklist
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS blocked_media (
+                file_unique_id TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                added_by INTEGER,
+                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            ) WITHOUT ROWID
+        ''')
+
+        # Migrate legacy username grants that were stored under the placeholder id 0
+        for table, role, by_column in (('approved_users', 'approved', 'approved_by'),
+                                       ('sudo_users', 'sudo', 'added_by')):
+            cursor.execute(
+                f"INSERT OR IGNORE INTO pending_usernames (username, role, added_by) "
+                f"SELECT LOWER(LTRIM(username, '@')), ?, {by_column} FROM {table} "
+                f"WHERE user_id = 0 AND username IS NOT NULL",
+                (role,)
+            )
+            cursor.execute(f'DELETE FROM {table} WHERE user_id = 0')
         
         conn.commit()
 
-    def add_approved_user(self, user_id: int, username: str, approved_by: int) -> bool:
-        """Add a user to the approved users list."""
+    @staticmethod
+    def _ensure_column(cursor, table: str, column: str, definition: str):
+        """Add a column to an existing table if an older schema lacks it."""
+        cursor.execute(f'PRAGMA table_info({table})')
+        if column not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+    @staticmethod
+    def normalize_username(username: str) -> str:
+        """Normalize a username for case-insensitive matching (strip '@', lowercase)."""
+        return username.lstrip('@').lower()
+
+    def _load_pending_usernames(self):
+        """Load pending username grants into memory."""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT username, role, added_by, expires_at FROM pending_usernames')
+            pending: Dict[str, Dict[str, Tuple[int, Optional[int]]]] = {}
+            for username, role, added_by, expires_at in cursor.fetchall():
+                pending.setdefault(self.normalize_username(username), {})[role] = (added_by, expires_at)
+            self._pending_usernames = pending
+        except Exception as e:
+            logger.error("Error loading pending usernames: %s", e)
+
+    def add_pending_username(self, username: str, role: str, added_by: int,
+                             expires_at: Optional[int] = None) -> bool:
+        """Record a grant ('approved' or 'sudo') for a username whose id is not known yet.
+
+        ``expires_at`` (unix time) carries over to the approval once the user is seen;
+        a grant still pending at that time lapses.
+        """
+        username = self.normalize_username(username)
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
             cursor.execute(
-                'INSERT OR REPLACE INTO approved_users (user_id, username, approved_by) VALUES (?, ?, ?)',
-                (user_id, username, approved_by)
+                'INSERT OR REPLACE INTO pending_usernames (username, role, added_by, expires_at) '
+                'VALUES (?, ?, ?, ?)',
+                (username, role, added_by, expires_at)
             )
             conn.commit()
+            with self._lock:
+                roles = dict(self._pending_usernames.get(username, {}))
+                roles[role] = (added_by, expires_at)
+                self._pending_usernames = {**self._pending_usernames, username: roles}
             return True
         except Exception as e:
-            logger.error(f"Error adding approved user: {e}")
+            logger.error("Error adding pending username: %s", e)
+            return False
+
+    def remove_pending_username(self, username: str, role: str) -> bool:
+        """Drop a pending grant. Returns True if one existed."""
+        username = self.normalize_username(username)
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM pending_usernames WHERE username = ? AND role = ?', (username, role))
+            conn.commit()
+            with self._lock:
+                roles = dict(self._pending_usernames.get(username, {}))
+                roles.pop(role, None)
+                pending = dict(self._pending_usernames)
+                if roles:
+                    pending[username] = roles
+                else:
+                    pending.pop(username, None)
+                self._pending_usernames = pending
+            return cursor.rowcount > 0
+        except Exception as e:
+            logger.error("Error removing pending username: %s", e)
+            return False
+
+    def resolve_pending_username(self, user_id: int, username: Optional[str]) -> List[str]:
+        """Bind pending grants for ``username`` to ``user_id``.
+
+        Called for every incoming message, so the no-pending case is a single
+        dict lookup. Returns the roles that were granted.
+        """
+        if not username or not self._pending_usernames:
+            return []
+        key = username.lower()
+        roles = self._pending_usernames.get(key)
+        if not roles:
+            return []
+        granted = []
+        now = int(time.time())
+        for role, (added_by, expires_at) in roles.items():
+            if expires_at is not None and expires_at <= now:
+                self.remove_pending_username(key, role)
+            elif role == 'sudo':
+                if self.add_sudo_user(user_id, username, added_by):
+                    self.remove_pending_username(key, role)
+                    granted.append(role)
+            elif self.add_approved_user(user_id, username, added_by, expires_at):
+                self.remove_pending_username(key, role)
+                granted.append(role)
+        return granted
+
+    def get_pending_usernames(self) -> List[Tuple[str, str]]:
+        """Get list of all pending (username, role) grants."""
+        return [(username, role) for username, roles in self._pending_usernames.items() for role in roles]
+
+    def add_approved_user(self, user_id: int, username: str, approved_by: int,
+                          expires_at: Optional[int] = None) -> bool:
+        """Add a user to the approved users list, optionally until ``expires_at`` (unix time)."""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                'INSERT OR REPLACE INTO approved_users (user_id, username, approved_by, expires_at) '
+                'VALUES (?, ?, ?, ?)',
+                (user_id, username, approved_by, expires_at)
+            )
+            conn.commit()
+            self._negative_cache.pop(('approved', user_id))
+            self._approval_cache.set(user_id, float('inf') if expires_at is None else expires_at)
+            return True
+        except Exception as e:
+            logger.error("Error adding approved user: %s", e)
             return False
 
     def remove_approved_user(self, user_id: int) -> bool:
@@ -82,21 +435,70 @@ class Database:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM approved_users WHERE user_id = ?', (user_id,))
             conn.commit()
+            self._approval_cache.pop(user_id)
             return True
         except Exception as e:
-            logger.error(f"Error removing approved user: {e}")
+            logger.error("Error removing approved user: %s", e)
             return False
 
-    def is_user_approved(self, user_id: int) -> bool:
-        """Check if a user is approved."""
+    def get_approval_expiry(self, user_id: int) -> Optional[float]:
+        """Return when a user's approval expires (inf if permanent), or None if not approved.
+
+        The expiry is cached alongside the approval, so callers compare it
+        against the clock instead of re-querying the database.
+        """
+        expires_at = self._approval_cache.get(user_id)
+        if expires_at is not None:
+            return expires_at
+        if ('approved', user_id) in self._negative_cache:
+            return None
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
-            cursor.execute('SELECT 1 FROM approved_users WHERE user_id = ?', (user_id,))
-            return cursor.fetchone() is not None
+            cursor.execute('SELECT expires_at FROM approved_users WHERE user_id = ?', (user_id,))
+            row = cursor.fetchone()
+            if row is None:
+                self._negative_cache.set(('approved', user_id), True)
+                return None
+            expires_at = float('inf') if row[0] is None else row[0]
+            self._approval_cache.set(user_id, expires_at)
+            return expires_at
         except Exception as e:
-            logger.error(f"Error checking approved user: {e}")
-            return False
+            logger.error("Error checking approved user: %s", e)
+            return None
+
+    def is_user_approved(self, user_id: int) -> bool:
+        """Check if a user is approved (and the approval has not expired)."""
+        expires_at = self.get_approval_expiry(user_id)
+        return expires_at is not None and expires_at > time.time()
+
+    def revoke_expired_approvals(self) -> List[int]:
+        """Delete every approval and pending grant whose expiry has passed, in one
+        transaction. Returns revoked ids."""
+        now = int(time.time())
+        try:
+            conn = self.get_connection()
+            # The transaction is always ended, so the sweep never holds the write lock
+            with conn:
+                cursor = conn.execute(
+                    'DELETE FROM approved_users WHERE expires_at IS NOT NULL AND expires_at <= ? '
+                    'RETURNING user_id',
+                    (now,)
+                )
+                revoked = [row[0] for row in cursor.fetchall()]
+                cursor = conn.execute(
+                    'DELETE FROM pending_usernames WHERE expires_at IS NOT NULL AND expires_at <= ?', (now,)
+                )
+                lapsed = cursor.rowcount
+            if lapsed:
+                self._load_pending_usernames()
+            for user_id in revoked:
+                self._approval_cache.pop(user_id)
+                self._negative_cache.set(('approved', user_id), True)
+            return revoked
+        except Exception as e:
+            logger.error("Error revoking expired approvals: %s", e)
+            return []
 
     def add_sudo_user(self, user_id: int, username: str, added_by: int) -> bool:
         """Add a user to the sudo users list."""
@@ -108,9 +510,10 @@ class Database:
                 (user_id, username, added_by)
             )
             conn.commit()
+            self._negative_cache.pop(('sudo', user_id))
             return True
         except Exception as e:
-            logger.error(f"Error adding sudo user: {e}")
+            logger.error("Error adding sudo user: %s", e)
             return False
 
     def remove_sudo_user(self, user_id: int) -> bool:
@@ -122,18 +525,23 @@ class Database:
             conn.commit()
             return True
         except Exception as e:
-            logger.error(f"Error removing sudo user: {e}")
+            logger.error("Error removing sudo user: %s", e)
             return False
 
     def is_sudo_user(self, user_id: int) -> bool:
         """Check if a user is a sudo user."""
+        if ('sudo', user_id) in self._negative_cache:
+            return False
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
             cursor.execute('SELECT 1 FROM sudo_users WHERE user_id = ?', (user_id,))
-            return cursor.fetchone() is not None
+            found = cursor.fetchone() is not None
+            if not found:
+                self._negative_cache.set(('sudo', user_id), True)
+            return found
         except Exception as e:
-            logger.error(f"Error checking sudo user: {e}")
+            logger.error("Error checking sudo user: %s", e)
             return False
 
     def get_approved_users(self) -> List[Tuple[int, str]]:
@@ -144,7 +552,7 @@ class Database:
             cursor.execute('SELECT user_id, username FROM approved_users')
             return cursor.fetchall()
         except Exception as e:
-            logger.error(f"Error getting approved users: {e}")
+            logger.error("Error getting approved users: %s", e)
             return []
 
     def get_sudo_users(self) -> List[Tuple[int, str]]:
@@ -155,5 +563,719 @@ class Database:
             cursor.execute('SELECT user_id, username FROM sudo_users')
             return cursor.fetchall()
         except Exception as e:
-            logger.error(f"Error getting sudo users: {e}")
-            return []
\ No newline at end of file
+            logger.error("Error getting sudo users: %s", e)
+            return []
+
+    def record_seen_user(self, user_id: int, username: Optional[str], chat_id: int):
+        """Buffer a sighting of a user in a chat; persisted by flush_seen_users()."""
+        entry = (username, int(time.time()))
+        with self._seen_lock:
+            self._seen_buffer[(user_id, chat_id)] = entry
+
+    def flush_seen_users(self) -> int:
+        """Write buffered sightings to the database in one batch. Returns rows written."""
+        with self._seen_lock:
+            if not self._seen_buffer:
+                return 0
+            buffer, self._seen_buffer = self._seen_buffer, {}
+        rows = [(user_id, chat_id, username, last_seen)
+                for (user_id, chat_id), (username, last_seen) in buffer.items()]
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.executemany(
+                'INSERT INTO seen_users (user_id, chat_id, username, last_seen) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (user_id, chat_id) DO UPDATE SET '
+                'username = excluded.username, last_seen = excluded.last_seen',
+                rows
+            )
+            conn.commit()
+            return len(rows)
+        except Exception as e:
+            logger.error("Error flushing seen users: %s", e)
+            # Put the batch back so it is retried on the next flush (newer sightings win)
+            with self._seen_lock:
+                for key, entry in buffer.items():
+                    self._seen_buffer.setdefault(key, entry)
+            return 0
+
+    def get_user_id_by_username(self, username: str) -> Optional[int]:
+        """Resolve a username to the most recently seen user id, if any."""
+        key = self.normalize_username(username)
+        with self._seen_lock:
+            best = max(
+                ((last_seen, user_id) for (user_id, _), (name, last_seen) in self._seen_buffer.items()
+                 if name and name.lower() == key),
+                default=None
+            )
+        if best:
+            return best[1]
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                'SELECT user_id FROM seen_users WHERE username = ? ORDER BY last_seen DESC LIMIT 1',
+                (key,)
+            )
+            row = cursor.fetchone()
+            return row[0] if row else None
+        except Exception as e:
+            logger.error("Error resolving username: %s", e)
+            return None
+
+    def get_seen_users(self, chat_id: int, limit: int = 50) -> List[Tuple[int, Optional[str], int]]:
+        """Get the most recently seen (user_id, username, last_seen) rows for a chat."""
+        self.flush_seen_users()
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                'SELECT user_id, username, last_seen FROM seen_users WHERE chat_id = ? '
+                'ORDER BY last_seen DESC LIMIT ?',
+                (chat_id, limit)
+            )
+            return cursor.fetchall()
+        except Exception as e:
+            logger.error("Error getting seen users: %s", e)
+            return []
+
+    def get_chat_settings(self, chat_id: int) -> ChatSettings:
+        """Get a chat's moderation settings (served from memory after the first load)."""
+        settings = self._chat_settings.get(chat_id)
+        if settings is not None:
+            return settings
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT {', '.join(f.name for f in _SETTINGS_FIELDS)} FROM chat_settings WHERE chat_id = ?",
+                (chat_id,)
+            )
+            row = cursor.fetchone()
+        except Exception as e:
+            logger.error("Error getting chat settings: %s", e)
+            return DEFAULT_CHAT_SETTINGS
+        if row is None:
+            settings = DEFAULT_CHAT_SETTINGS
+        else:
+            values = {
+                f.name: bool(value) if f.type is bool else value
+                for f, value in zip(_SETTINGS_FIELDS, row)
+            }
+            # Masks saved when more media kinds were listed may carry bits no kind uses now
+            values['unapproved_media_mask'] &= ALL_MEDIA_MASK
+            values['approved_media_mask'] &= ALL_MEDIA_MASK
+            settings = ChatSettings(**values)
+        self._chat_settings[chat_id] = settings
+        return settings
+
+    def update_chat_settings(self, chat_id: int, updated_by: int, **changes) -> Optional[ChatSettings]:
+        """Persist changed settings for a chat and refresh the cached copy."""
+        settings = replace(self.get_chat_settings(chat_id), **changes)
+        columns = [f.name for f in _SETTINGS_FIELDS]
+        values = [int(value) if isinstance(value, bool) else value
+                  for value in (getattr(settings, name) for name in columns)]
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                f"INSERT OR REPLACE INTO chat_settings (chat_id, {', '.join(columns)}, updated_by) "
+                f"VALUES ({', '.join('?' * (len(columns) + 2))})",
+                (chat_id, *values, updated_by)
+            )
+            conn.commit()
+            self._chat_settings[chat_id] = settings
+            return settings
+        except Exception as e:
+            logger.error("Error updating chat settings: %s", e)
+            return None
+
+    def get_media_allowlist(self, chat_id: int) -> Dict[str, frozenset]:
+        """Get a chat's media allowlist as {kind: frozenset(values)} (cached after first load)."""
+        allowlist = self._media_allowlists.get(chat_id)
+        if allowlist is not None:
+            return allowlist
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT kind, value FROM media_allowlist WHERE chat_id = ?', (chat_id,))
+            grouped: Dict[str, set] = {}
+            for kind, value in cursor.fetchall():
+                grouped.setdefault(kind, set()).add(value)
+        except Exception as e:
+            logger.error("Error getting media allowlist: %s", e)
+            return {}
+        allowlist = {kind: frozenset(values) for kind, values in grouped.items()}
+        self._media_allowlists[chat_id] = allowlist
+        return allowlist
+
+    def add_media_allowlist(self, chat_id: int, kind: str, value: str, added_by: int) -> bool:
+        """Allow a sticker set ('sticker_set') or animation ('animation') in a chat."""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                'INSERT OR REPLACE INTO media_allowlist (chat_id, kind, value, added_by) VALUES (?, ?, ?, ?)',
+                (chat_id, kind, value, added_by)
+            )
+            conn.commit()
+            allowlist = dict(self.get_media_allowlist(chat_id))
+            allowlist[kind] = allowlist.get(kind, frozenset()) | {value}
+            self._media_allowlists[chat_id] = allowlist
+            return True
+        except Exception as e:
+            logger.error("Error adding media allowlist entry: %s", e)
+            return False
+
+    def remove_media_allowlist(self, chat_id: int, kind: str, value: str) -> bool:
+        """Remove an allowlist entry. Returns True if one existed."""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                'DELETE FROM media_allowlist WHERE chat_id = ? AND kind = ? AND value = ?',
+                (chat_id, kind, value)
+            )
+            conn.commit()
+            allowlist = dict(self.get_media_allowlist(chat_id))
+            allowlist[kind] = allowlist.get(kind, frozenset()) - {value}
+            self._media_allowlists[chat_id] = allowlist
+            return cursor.rowcount > 0
+        except Exception as e:
+            logger.error("Error removing media allowlist entry: %s", e)
+            return False
+
+    def _load_blocked_media(self):
+        """Load the known-bad media blocklist into memory."""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT file_unique_id, source FROM blocked_media')
+            self._blocked_media = dict(cursor.fetchall())
+        except Exception as e:
+            logger.error("Error loading blocked media: %s", e)
+
+    def get_media_block_source(self, file_unique_id: str) -> Optional[str]:
+        """Check a file against the in-memory blocklist; returns 'owner', 'auto' or None."""
+        return self._blocked_media.get(file_unique_id)
+
+    def add_blocked_media(self, file_unique_id: str, source: str, added_by: Optional[int]) -> bool:
+        """Block a media file everywhere. ``source`` is 'owner' or 'auto'."""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                'INSERT OR REPLACE INTO blocked_media (file_unique_id, source, added_by) VALUES (?, ?, ?)',
+                (file_unique_id, source, added_by)
+            )
+            conn.commit()
+            with self._lock:
+                self._blocked_media = {**self._blocked_media, file_unique_id: source}
+            return True
+        except Exception as e:
+            logger.error("Error adding blocked media: %s", e)
+            return False
+
+    def remove_blocked_media(self, file_unique_id: str) -> bool:
+        """Unblock a media file. Returns True if it was blocked."""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM blocked_media WHERE file_unique_id = ?', (file_unique_id,))
+            conn.commit()
+            with self._lock:
+                self._blocked_media = {fid: source for fid, source in self._blocked_media.items()
+                                       if fid != file_unique_id}
+            self._media_deletions.pop(file_unique_id)
+            return cursor.rowcount > 0
+        except Exception as e:
+            logger.error("Error removing blocked media: %s", e)
+            return False
+
+    def record_media_deletion(self, file_unique_id: str, chat_id: int) -> bool:
+        """Note that a file was deleted in a chat; block it once enough chats have deleted it.
+
+        Returns True if this deletion caused the file to be blocked.
+        """
+        now = time.monotonic()
+        with self._lock:
+            chats = {cid: ts for cid, ts in self._media_deletions.get(file_unique_id, {}).items()
+                     if now - ts < AUTO_BLOCK_WINDOW}
+            chats[chat_id] = now
+            self._media_deletions.set(file_unique_id, chats)
+        if len(chats) < AUTO_BLOCK_CHAT_THRESHOLD:
+            return False
+        self._media_deletions.pop(file_unique_id)
+        return self.add_blocked_media(file_unique_id, 'auto', None)
+
+    def _load_domain_rules(self):
+        """Load all domain rules into per-chat suffix tries."""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT chat_id, domain, rule FROM domain_rules')
+            tries: Dict[int, DomainTrie] = {}
+            for chat_id, domain, rule in cursor.fetchall():
+                tries.setdefault(chat_id, DomainTrie()).insert(domain, rule)
+            self._domain_rules = tries
+        except Exception as e:
+            logger.error("Error loading domain rules: %s", e)
+
+    def set_domain_rule(self, chat_id: int, domain: str, rule: str, added_by: int) -> bool:
+        """Block or allow a domain (and its subdomains) in a chat, or globally with chat_id 0."""
+        domain = domain.lower().strip('.')
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                'INSERT OR REPLACE INTO domain_rules (chat_id, domain, rule, added_by) VALUES (?, ?, ?, ?)',
+                (chat_id, domain, rule, added_by)
+            )
+            conn.commit()
+            self._domain_rules.setdefault(chat_id, DomainTrie()).insert(domain, rule)
+            return True
+        except Exception as e:
+            logger.error("Error setting domain rule: %s", e)
+            return False
+
+    def remove_domain_rule(self, chat_id: int, domain: str) -> bool:
+        """Remove a domain rule. Returns True if one existed."""
+        domain = domain.lower().strip('.')
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM domain_rules WHERE chat_id = ? AND domain = ?', (chat_id, domain))
+            conn.commit()
+            trie = self._domain_rules.get(chat_id)
+            if trie is not None:
+                trie.remove(domain)
+            return cursor.rowcount > 0
+        except Exception as e:
+            logger.error("Error removing domain rule: %s", e)
+            return False
+
+    def get_domain_rules(self, chat_id: int) -> List[Tuple[str, str]]:
+        """Get (domain, rule) pairs configured for a chat (0 for global rules)."""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT domain, rule FROM domain_rules WHERE chat_id = ? ORDER BY domain', (chat_id,))
+            return cursor.fetchall()
+        except Exception as e:
+            logger.error("Error getting domain rules: %s", e)
+            return []
+
+    def match_domain(self, chat_id: int, host: str) -> Optional[Tuple[str, str]]:
+        """Find the rule for a host: the chat's own rules take precedence over global ones."""
+        for scope in (chat_id, 0):
+            trie = self._domain_rules.get(scope)
+            if trie:
+                match = trie.match(host)
+                if match:
+                    return match
+        return None
+
+    def record_domain_hit(self, chat_id: int, domain: str):
+        """Count a moderated link for reporting."""
+        with self._stats_lock:
+            self._domain_hits[(chat_id, domain)] += 1
+
+    def get_domain_hits(self, chat_id: int, limit: int = 10) -> List[Tuple[str, int]]:
+        """Most frequently moderated domains in a chat since startup."""
+        with self._stats_lock:
+            hits = Counter({domain: count for (cid, domain), count in self._domain_hits.items() if cid == chat_id})
+        return hits.most_common(limit)
+
+    def get_channel_rules(self, chat_id: int) -> Dict[str, frozenset]:
+        """Get a chat's forward source rules as {'allow': ids, 'deny': ids} (cached after first load)."""
+        rules = self._channel_rules.get(chat_id)
+        if rules is not None:
+            return rules
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT channel_id, rule FROM channel_rules WHERE chat_id = ?', (chat_id,))
+            grouped: Dict[str, set] = {'allow': set(), 'deny': set()}
+            for channel_id, rule in cursor.fetchall():
+                grouped[rule].add(channel_id)
+        except Exception as e:
+            logger.error("Error getting channel rules: %s", e)
+            return {'allow': frozenset(), 'deny': frozenset()}
+        rules = {rule: frozenset(ids) for rule, ids in grouped.items()}
+        self._channel_rules[chat_id] = rules
+        return rules
+
+    def set_channel_rule(self, chat_id: int, channel_id: int, title: Optional[str], rule: str,
+                         added_by: int) -> bool:
+        """Always allow ('allow') or always delete ('deny') forwards from a channel in a chat."""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                'INSERT OR REPLACE INTO channel_rules (chat_id, channel_id, title, rule, added_by) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (chat_id, channel_id, title, rule, added_by)
+            )
+            conn.commit()
+            rules = self.get_channel_rules(chat_id)
+            self._channel_rules[chat_id] = {
+                name: ids | {channel_id} if name == rule else ids - {channel_id}
+                for name, ids in rules.items()
+            }
+            return True
+        except Exception as e:
+            logger.error("Error setting channel rule: %s", e)
+            return False
+
+    def remove_channel_rule(self, chat_id: int, channel_id: int) -> bool:
+        """Remove a channel rule. Returns True if one existed."""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM channel_rules WHERE chat_id = ? AND channel_id = ?', (chat_id, channel_id))
+            conn.commit()
+            rules = self.get_channel_rules(chat_id)
+            self._channel_rules[chat_id] = {name: ids - {channel_id} for name, ids in rules.items()}
+            return cursor.rowcount > 0
+        except Exception as e:
+            logger.error("Error removing channel rule: %s", e)
+            return False
+
+    def get_channel_rule_list(self, chat_id: int) -> List[Tuple[int, Optional[str], str]]:
+        """Get (channel_id, title, rule) rows for a chat."""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT channel_id, title, rule FROM channel_rules WHERE chat_id = ?', (chat_id,))
+            return cursor.fetchall()
+        except Exception as e:
+            logger.error("Error getting channel rules: %s", e)
+            return []
+
+    def record_forward(self, chat_id: int, channel_id: int, title: Optional[str], deleted: bool):
+        """Count a forward from a channel (and whether it was deleted) for reporting."""
+        with self._stats_lock:
+            stats = self._forward_stats.get((chat_id, channel_id))
+            if stats is None:
+                stats = self._forward_stats[(chat_id, channel_id)] = [0, 0, title]
+            stats[0] += 1
+            stats[1] += deleted
+
+    def get_forward_stats(self, chat_id: int, limit: int = 10) -> List[Tuple[int, Optional[str], int, int]]:
+        """Top forward sources in a chat since startup as (channel_id, title, seen, deleted)."""
+        with self._stats_lock:
+            rows = [(channel_id, title, seen, deleted)
+                    for (cid, channel_id), (seen, deleted, title) in self._forward_stats.items() if cid == chat_id]
+        return sorted(rows, key=lambda row: row[2], reverse=True)[:limit]
+
+    def _load_filter_rules(self):
+        """Compile all enabled filter rules."""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT id, pattern, shadow FROM filter_rules WHERE enabled = 1')
+            compiled = []
+            for rule_id, pattern, shadow in cursor.fetchall():
+                try:
+                    compiled.append((rule_id, SafePattern(pattern), bool(shadow)))
+                except PatternError as e:
+                    logger.error("Skipping filter rule %s: %s", rule_id, e)
+            self._filter_rules.load(compiled)
+        except Exception as e:
+            logger.error("Error loading filter rules: %s", e)
+
+    def add_filter_rule(self, pattern: SafePattern, added_by: int, shadow: bool = False) -> Optional[int]:
+        """Store a compiled filter rule and start applying it (or only evaluating it, in shadow mode).
+
+        Returns the new rule ID.
+        """
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                'INSERT INTO filter_rules (pattern, shadow, added_by) VALUES (?, ?, ?)',
+                (pattern.pattern, int(shadow), added_by)
+            )
+            conn.commit()
+            self._filter_rules.add(cursor.lastrowid, pattern, shadow)
+            return cursor.lastrowid
+        except Exception as e:
+            logger.error("Error adding filter rule: %s", e)
+            return None
+
+    def remove_filter_rule(self, rule_id: int) -> bool:
+        """Delete a filter rule. Returns True if it existed."""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM filter_rules WHERE id = ?', (rule_id,))
+            conn.commit()
+            self._filter_rules.remove(rule_id)
+            return cursor.rowcount > 0
+        except Exception as e:
+            logger.error("Error removing filter rule: %s", e)
+            return False
+
+    def update_filter_rule(self, rule_id: int, enabled: Optional[bool] = None, shadow: Optional[bool] = None,
+                           reason: Optional[str] = None) -> bool:
+        """Enable/disable a filter rule (recording why it was disabled) or move it in or out of shadow mode.
+
+        Returns True if the rule exists.
+        """
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT pattern, enabled, shadow FROM filter_rules WHERE id = ?', (rule_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return False
+            pattern, current_enabled, current_shadow = row
+            enabled = bool(current_enabled) if enabled is None else enabled
+            shadow = bool(current_shadow) if shadow is None else shadow
+            compiled = SafePattern(pattern) if enabled else None
+            cursor.execute(
+                'UPDATE filter_rules SET enabled = ?, shadow = ?, disabled_reason = ? WHERE id = ?',
+                (int(enabled), int(shadow), None if enabled else reason, rule_id)
+            )
+            conn.commit()
+            if compiled is not None:
+                self._filter_rules.add(rule_id, compiled, shadow)
+            else:
+                self._filter_rules.remove(rule_id)
+            return True
+        except Exception as e:
+            logger.error("Error updating filter rule: %s", e)
+            return False
+
+    def get_filter_rules(self) -> List[Tuple[int, str, bool, bool, Optional[str]]]:
+        """Get all filter rules as (id, pattern, enabled, shadow, disabled_reason)."""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT id, pattern, enabled, shadow, disabled_reason FROM filter_rules ORDER BY id')
+            return [(rule_id, pattern, bool(enabled), bool(shadow), reason)
+                    for rule_id, pattern, enabled, shadow, reason in cursor.fetchall()]
+        except Exception as e:
+            logger.error("Error getting filter rules: %s", e)
+            return []
+
+    def get_filter_rule_stats(self, rule_id: int) -> Optional[RuleStats]:
+        """Evaluation counters, CPU time and match samples of a rule since startup."""
+        return self._filter_rules.stats(rule_id)
+
+    def check_filter_rules(self, text: str) -> Tuple[Optional[int], List[int]]:
+        """Match normalized text against the filter rules.
+
+        Shadow rules are evaluated for their statistics only. Returns (matching
+        live rule ID or None, IDs of rules just disabled for repeatedly
+        exceeding their time budget).
+        """
+        if not len(self._filter_rules):
+            return None, []
+        rule_id, exhausted = self._filter_rules.check(text)
+        for slow_rule in exhausted:
+            self.update_filter_rule(slow_rule, enabled=False, reason='time budget exceeded')
+        return rule_id, exhausted
+
+    @staticmethod
+    def _decay(score: float, updated_at: float, now: float) -> float:
+        """Score after halving every WARN_HALF_LIFE seconds since updated_at."""
+        return score * 0.5 ** (max(0.0, now - updated_at) / WARN_HALF_LIFE)
+
+    def _load_warning_points(self, key: Tuple[int, int]) -> Tuple[float, float]:
+        # Caller holds _warnings_lock
+        entry = self._warning_points.get(key)
+        if entry is not None:
+            return entry
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT score, updated_at FROM warning_points WHERE chat_id = ? AND user_id = ?', key)
+            row = cursor.fetchone()
+        except Exception as e:
+            logger.error("Error getting warning points: %s", e)
+            row = None
+        entry = (row[0], row[1]) if row else (0.0, 0.0)
+        self._warning_points[key] = entry
+        return entry
+
+    def get_warning_points(self, chat_id: int, user_id: int) -> float:
+        """Current (decayed) warning points of a user in a chat."""
+        with self._warnings_lock:
+            score, updated_at = self._load_warning_points((chat_id, user_id))
+        return self._decay(score, updated_at, time.time())
+
+    def add_warning_points(self, chat_id: int, user_id: int, points: float = 1.0) -> float:
+        """Add points to a user's decayed score and return the new score; persisted by flush_warning_points()."""
+        key = (chat_id, user_id)
+        now = time.time()
+        with self._warnings_lock:
+            score, updated_at = self._load_warning_points(key)
+            score = self._decay(score, updated_at, now) + points
+            self._warning_points[key] = (score, now)
+            self._dirty_warnings.add(key)
+        return score
+
+    def reset_warning_points(self, chat_id: int, user_id: int):
+        """Clear a user's warning points in a chat."""
+        key = (chat_id, user_id)
+        with self._warnings_lock:
+            self._warning_points[key] = (0.0, time.time())
+            self._dirty_warnings.add(key)
+
+    def flush_warning_points(self) -> int:
+        """Persist changed scores in one batch and forget ones that have decayed away. Returns rows written."""
+        now = time.time()
+        with self._warnings_lock:
+            dirty, self._dirty_warnings = self._dirty_warnings, set()
+            rows = []
+            for chat_id, user_id in dirty:
+                score, updated_at = self._warning_points[(chat_id, user_id)]
+                rows.append((chat_id, user_id, score, int(updated_at)))
+            # Scores below 0.01 are indistinguishable from a clean record
+            faded = {key for key, (score, updated_at) in self._warning_points.items()
+                     if self._decay(score, updated_at, now) < 0.01}
+            for key in faded:
+                del self._warning_points[key]
+        if not rows and not faded:
+            return 0
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.executemany(
+                'INSERT OR REPLACE INTO warning_points (chat_id, user_id, score, updated_at) VALUES (?, ?, ?, ?)',
+                [row for row in rows if (row[0], row[1]) not in faded]
+            )
+            cursor.executemany('DELETE FROM warning_points WHERE chat_id = ? AND user_id = ?', faded)
+            conn.commit()
+            return len(rows)
+        except Exception as e:
+            logger.error("Error flushing warning points: %s", e)
+            # Mark the batch dirty again so it is retried on the next flush
+            with self._warnings_lock:
+                self._dirty_warnings |= {key for key in dirty if key in self._warning_points}
+            return 0
+
+    def get_moderated_chats(self) -> List[int]:
+        """Group chats the bot moderates: those with settings or with seen members."""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                'SELECT chat_id FROM chat_settings WHERE chat_id < 0 '
+                'UNION SELECT DISTINCT chat_id FROM seen_users WHERE chat_id < 0'
+            )
+            return [row[0] for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error("Error getting moderated chats: %s", e)
+            return []
+
+    def _load_global_bans(self):
+        """Load the global ban list into memory."""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT user_id FROM global_bans')
+            self._global_bans = frozenset(row[0] for row in cursor.fetchall())
+        except Exception as e:
+            logger.error("Error loading global bans: %s", e)
+
+    def is_globally_banned(self, user_id: int) -> bool:
+        return user_id in self._global_bans
+
+    def _queue_global_ban_action(self, cursor, user_id: int, action: str) -> int:
+        """Queue ``action`` ('ban' or 'unban') for a user in every moderated chat; returns the chat count."""
+        chats = self.get_moderated_chats()
+        cursor.executemany(
+            'INSERT OR REPLACE INTO global_ban_queue (user_id, chat_id, action, attempts) VALUES (?, ?, ?, 0)',
+            [(user_id, chat_id, action) for chat_id in chats]
+        )
+        return len(chats)
+
+    def add_global_ban(self, user_id: int, reason: Optional[str], banned_by: int) -> Optional[int]:
+        """Add a user to the global ban list and queue the ban in every moderated chat.
+
+        Returns the number of chats queued, or None on failure.
+        """
+        try:
+            self.flush_seen_users()  # so chats only seen in memory are included
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                'INSERT OR REPLACE INTO global_bans (user_id, reason, banned_by) VALUES (?, ?, ?)',
+                (user_id, reason, banned_by)
+            )
+            queued = self._queue_global_ban_action(cursor, user_id, 'ban')
+            conn.commit()
+            with self._lock:
+                self._global_bans = self._global_bans | {user_id}
+            return queued
+        except Exception as e:
+            logger.error("Error adding global ban: %s", e)
+            return None
+
+    def remove_global_ban(self, user_id: int) -> Optional[int]:
+        """Lift a global ban and queue the unban in every moderated chat.
+
+        Returns the number of chats queued, or None on failure.
+        """
+        try:
+            self.flush_seen_users()
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM global_bans WHERE user_id = ?', (user_id,))
+            queued = self._queue_global_ban_action(cursor, user_id, 'unban')
+            conn.commit()
+            with self._lock:
+                self._global_bans = self._global_bans - {user_id}
+            return queued
+        except Exception as e:
+            logger.error("Error removing global ban: %s", e)
+            return None
+
+    def get_global_ban_tasks(self, limit: int) -> List[Tuple[int, int, str, int]]:
+        """Pending propagation work as (user_id, chat_id, action, attempts), fewest attempts first."""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                'SELECT user_id, chat_id, action, attempts FROM global_ban_queue ORDER BY attempts LIMIT ?',
+                (limit,)
+            )
+            return cursor.fetchall()
+        except Exception as e:
+            logger.error("Error getting global ban queue: %s", e)
+            return []
+
+    def finish_global_ban_tasks(self, done: List[Tuple[int, int, str]], failed: List[Tuple[int, int, str]],
+                                max_attempts: int):
+        """Remove completed (user_id, chat_id, action) tasks and count an attempt on failed ones,
+        dropping those that have failed ``max_attempts`` times.
+
+        Matching on the action leaves alone a task that was replaced (ban <-> unban) meanwhile.
+        """
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.executemany(
+                'DELETE FROM global_ban_queue WHERE user_id = ? AND chat_id = ? AND action = ?', done
+            )
+            cursor.executemany(
+                'UPDATE global_ban_queue SET attempts = attempts + 1 WHERE user_id = ? AND chat_id = ? AND action = ?',
+                failed
+            )
+            cursor.execute('DELETE FROM global_ban_queue WHERE attempts >= ?', (max_attempts,))
+            conn.commit()
+        except Exception as e:
+            logger.error("Error updating global ban queue: %s", e)
+
+    def get_global_ban_stats(self) -> Tuple[int, int]:
+        """(number of globally banned users, number of chats still waiting for a ban/unban)."""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT (SELECT COUNT(*) FROM global_bans), (SELECT COUNT(*) FROM global_ban_queue)')
+            return cursor.fetchone()
+        except Exception as e:
+            logger.error("Error getting global ban stats: %s", e)
+            return 0, 0
@@ -0,0 +1,74 @@
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import urlsplit
+
+_VALUE = object()  # Key under which a trie node stores the rule for the domain ending there
+
+
+def extract_host(url: str) -> Optional[str]:
+    """Return the lowercased host of a URL, accepting scheme-less links like t.me/foo"""
+    if '://' not in url:
+        url = '//' + url
+    try:
+        host = urlsplit(url).hostname
+    except ValueError:
+        return None
+    return host.rstrip('.') if host else None
+
+
+class DomainTrie:
+    """Domain rules stored by reversed labels (com -> example -> www).
+
+    Looking up a host walks at most one node per label and returns the rule
+    of the most specific matching suffix, so a rule for ``example.com`` also
+    covers ``a.b.example.com`` while ``b.example.com`` can override it.
+    """
+
+    def __init__(self, rules: Iterable[Tuple[str, str]] = ()):
+        self._root: Dict = {}
+        for domain, rule in rules:
+            self.insert(domain, rule)
+
+    @staticmethod
+    def _labels(domain: str):
+        return reversed(domain.lower().strip('.').split('.'))
+
+    def insert(self, domain: str, rule: str):
+        node = self._root
+        for label in self._labels(domain):
+            node = node.setdefault(label, {})
+        node[_VALUE] = rule
+
+    def remove(self, domain: str) -> bool:
+        path = [self._root]
+        for label in self._labels(domain):
+            node = path[-1].get(label)
+            if node is None:
+                return False
+            path.append(node)
+        if path[-1].pop(_VALUE, None) is None:
+            return False
+        # Prune now-empty branches
+        labels = list(self._labels(domain))
+        for depth in range(len(labels), 0, -1):
+            if path[depth]:
+                break
+            del path[depth - 1][labels[depth - 1]]
+        return True
+
+    def match(self, host: str) -> Optional[Tuple[str, str]]:
+        """Return (matched_domain, rule) for the longest rule suffix of ``host``"""
+        node = self._root
+        found = None
+        matched = []
+        for label in self._labels(host):
+            node = node.get(label)
+            if node is None:
+                break
+            matched.append(label)
+            rule = node.get(_VALUE)
+            if rule is not None:
+                found = ('.'.join(reversed(matched)), rule)
+        return found
+
+    def __bool__(self) -> bool:
+        return bool(self._root)
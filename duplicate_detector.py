@@ -0,0 +1,117 @@
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class NearDuplicateDetector:
+    """Streaming near-duplicate detector for cross-chat text spam bursts.
+
+    Each message is shingled into word n-grams and summarised by a MinHash
+    signature, which is bucketed into an LSH index (``bands`` bands of
+    ``rows`` values each). Messages whose signatures collide in any band are
+    candidates; a candidate counts as a duplicate when the fraction of equal
+    signature values reaches ``threshold``. Only the first ``max_tokens``
+    words are shingled, which bounds the hashing cost of long messages; spam
+    copies already agree on their opening. A message is flagged once
+    near-duplicates have been seen in ``burst_chats`` distinct chats within
+    ``window`` seconds. Memory is bounded by ``max_entries``; the oldest
+    signatures are evicted first.
+    """
+
+    def __init__(self, window: float, burst_chats: int, threshold: float = 0.6,
+                 bands: int = 8, rows: int = 4, shingle_size: int = 3,
+                 min_tokens: int = 5, max_tokens: int = 100, max_entries: int = 20000, seed: int = 1):
+        self.window = window
+        self.burst_chats = burst_chats
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+        self.shingle_size = shingle_size
+        self.min_tokens = min_tokens
+        self.max_tokens = max_tokens
+        self.max_entries = max_entries
+        rng = random.Random(seed)
+        self._perms = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+                       for _ in range(bands * rows)]
+        self._buckets: Dict[Tuple, Set[int]] = {}
+        self._entries: Dict[int, Tuple[float, int, Tuple[int, ...]]] = {}
+        self._order: Deque[int] = deque()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def signature(self, text: str) -> Optional[Tuple[int, ...]]:
+        """MinHash signature of a text, or None if it is too short to compare"""
+        tokens = _WORD_RE.findall(text.lower())[:self.max_tokens]
+        if len(tokens) < self.min_tokens:
+            return None
+        size = self.shingle_size
+        shingles = {hash(tuple(tokens[i:i + size])) & _MERSENNE_PRIME
+                    for i in range(len(tokens) - size + 1)}
+        return tuple(min((a * h + b) % _MERSENNE_PRIME for h in shingles) for a, b in self._perms)
+
+    def _band_keys(self, signature: Tuple[int, ...]) -> List[Tuple]:
+        rows = self.rows
+        return [(band, signature[band * rows:(band + 1) * rows]) for band in range(self.bands)]
+
+    def check(self, text: str, chat_id: int, now: Optional[float] = None) -> bool:
+        """Record a message and return True if it belongs to a cross-chat burst"""
+        signature = self.signature(text)
+        if signature is None:
+            return False
+        now = time.monotonic() if now is None else now
+        band_keys = self._band_keys(signature)
+        size = len(signature)
+
+        with self._lock:
+            self._expire(now)
+
+            candidates: Set[int] = set()
+            for key in band_keys:
+                bucket = self._buckets.get(key)
+                if bucket:
+                    candidates |= bucket
+
+            chats = {chat_id}
+            for entry_id in candidates:
+                _, other_chat, other = self._entries[entry_id]
+                if other_chat in chats:
+                    continue
+                same = sum(1 for x, y in zip(signature, other) if x == y)
+                if same >= self.threshold * size:
+                    chats.add(other_chat)
+                    if len(chats) >= self.burst_chats:
+                        break
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (now, chat_id, signature)
+            self._order.append(entry_id)
+            for key in band_keys:
+                self._buckets.setdefault(key, set()).add(entry_id)
+
+        return len(chats) >= self.burst_chats
+
+    def _expire(self, now: float):
+        # Entries are appended in time order, so expired/overflow ones are at the front
+        while self._order:
+            entry_id = self._order[0]
+            timestamp, _, signature = self._entries[entry_id]
+            if now - timestamp < self.window and len(self._order) < self.max_entries:
+                break
+            self._order.popleft()
+            del self._entries[entry_id]
+            for key in self._band_keys(signature):
+                bucket = self._buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(entry_id)
+                    if not bucket:
+                        del self._buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,59 @@
+from typing import NamedTuple, Optional
+
+from telegram import Message, MessageEntity
+
+from text_pipeline import normalize_text
+from utils import get_media_file_id
+
+# Edit classes, from harmless to suspicious
+NO_OP = 'no-op'                # nothing visible changed (e.g. Telegram adding a link preview)
+COSMETIC = 'cosmetic'          # case, spacing, punctuation around words, emoji or formatting only
+CONTENT_SWAP = 'content swap'  # different words, numbers, addresses or link targets
+MEDIA_SWAP = 'media swap'      # the attached file was replaced, added or removed
+UNKNOWN = 'unknown'            # the original is no longer remembered
+
+
+class Fingerprint(NamedTuple):
+    """Hashes of what a message showed when it was sent, kept instead of the content itself"""
+    exact: int     # text/caption and its entities (formatting, hidden link targets) as sent
+    skeleton: int  # words of the normalized text (see _skeleton) and link targets
+    media: int     # file_unique_id of the attachment (0 for none)
+
+
+def _skeleton(text: str) -> str:
+    """Normalized words with punctuation and emoji trimmed from their ends.
+
+    Punctuation inside a word is kept, so ``10.5`` -> ``105`` or
+    ``good-site.com`` -> ``goodsite.com`` still count as changed.
+    """
+    words = []
+    for word in normalize_text(text).split():
+        start, end = 0, len(word)
+        while start < end and not word[start].isalnum():
+            start += 1
+        while end > start and not word[end - 1].isalnum():
+            end -= 1
+        if start < end:
+            words.append(word[start:end])
+    return ' '.join(words)
+
+
+def message_fingerprint(message: Message) -> Fingerprint:
+    body = message.text or message.caption or ''
+    entities = tuple((message.entities if message.text else message.caption_entities) or ())
+    formatting = tuple((entity.type, entity.offset, entity.length, entity.url) for entity in entities)
+    links = tuple(entity.url for entity in entities if entity.type == MessageEntity.TEXT_LINK)
+    media_id = get_media_file_id(message)
+    return Fingerprint(hash((body, formatting)), hash((_skeleton(body), links)), hash(media_id) if media_id else 0)
+
+
+def classify_edit(original: Optional[Fingerprint], edited: Fingerprint) -> str:
+    if original is None:
+        return UNKNOWN
+    if original == edited:
+        return NO_OP
+    if original.media != edited.media:
+        return MEDIA_SWAP
+    if original.skeleton == edited.skeleton:
+        return COSMETIC
+    return CONTENT_SWAP
@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+from safe_regex import BudgetExceeded, SafePattern
+
+MAX_SAMPLES = 5
+SAMPLE_LENGTH = 200
+
+
+class RuleStats:
+    """Counters for one rule since startup"""
+    __slots__ = ('evaluations', 'matches', 'cpu_time', 'samples')
+
+    def __init__(self):
+        self.evaluations = 0
+        self.matches = 0
+        self.cpu_time = 0.0  # seconds
+        self.samples: Deque[str] = deque(maxlen=MAX_SAMPLES)
+
+    @property
+    def hit_rate(self) -> float:
+        return self.matches / self.evaluations if self.evaluations else 0.0
+
+    @property
+    def average_cost(self) -> float:
+        return self.cpu_time / self.evaluations if self.evaluations else 0.0
+
+
+class RuleSet:
+    """Operator-supplied text rules (see safe_regex), checked under a time budget.
+
+    Live rules act on the first match; shadow rules are evaluated on every
+    message without acting, keeping samples of what they match so a rule's
+    hit rate and false positives can be judged before it goes live. Both
+    kinds record evaluations, matches and CPU time.
+
+    Each rule gets ``budget`` seconds of CPU time per 1000 characters of the
+    message (the full budget for shorter ones); thread CPU time is used so
+    waiting for the GIL doesn't count against it. A rule that runs over is
+    skipped for that message and given a strike; after ``max_strikes`` it is
+    dropped from the set and returned to the caller to disable and report.
+    Compiled patterns are swapped in as new dicts so readers never lock.
+    """
+
+    def __init__(self, budget: float, max_strikes: int):
+        self.budget = budget
+        self.max_strikes = max_strikes
+        self._rules: Dict[int, SafePattern] = {}
+        self._shadow: Dict[int, SafePattern] = {}
+        self._strikes: Dict[int, int] = {}
+        self._stats: Dict[int, RuleStats] = {}
+        self._lock = threading.Lock()
+
+    def load(self, rules: Iterable[Tuple[int, SafePattern, bool]]):
+        """Replace all rules with (rule_id, pattern, shadow) triples"""
+        live, shadow = {}, {}
+        for rule_id, pattern, is_shadow in rules:
+            (shadow if is_shadow else live)[rule_id] = pattern
+        with self._lock:
+            self._rules, self._shadow = live, shadow
+            self._strikes = {}
+
+    def add(self, rule_id: int, pattern: SafePattern, shadow: bool = False):
+        with self._lock:
+            self._rules = {rid: p for rid, p in self._rules.items() if rid != rule_id}
+            self._shadow = {rid: p for rid, p in self._shadow.items() if rid != rule_id}
+            if shadow:
+                self._shadow[rule_id] = pattern
+            else:
+                self._rules[rule_id] = pattern
+            self._strikes.pop(rule_id, None)
+
+    def remove(self, rule_id: int):
+        with self._lock:
+            self._rules = {rid: p for rid, p in self._rules.items() if rid != rule_id}
+            self._shadow = {rid: p for rid, p in self._shadow.items() if rid != rule_id}
+            self._strikes.pop(rule_id, None)
+
+    def check(self, text: str) -> Tuple[Optional[int], List[int]]:
+        """Return (id of the first matching live rule or None, ids of rules that exhausted their strikes)"""
+        exhausted: List[int] = []
+        for rule_id, pattern in self._shadow.items():
+            self._evaluate(rule_id, pattern, text, exhausted)
+        for rule_id, pattern in self._rules.items():
+            if self._evaluate(rule_id, pattern, text, exhausted):
+                return rule_id, exhausted
+        return None, exhausted
+
+    def _evaluate(self, rule_id: int, pattern: SafePattern, text: str, exhausted: List[int]) -> bool:
+        started = time.thread_time()
+        budget = self.budget * max(1.0, len(text) / 1000)
+        try:
+            matched = pattern.search(text, started + budget)
+        except BudgetExceeded:
+            matched = None
+        elapsed = time.thread_time() - started
+
+        with self._lock:
+            stats = self._stats.get(rule_id)
+            if stats is None:
+                stats = self._stats[rule_id] = RuleStats()
+            stats.evaluations += 1
+            stats.cpu_time += elapsed
+            if matched:
+                stats.matches += 1
+                stats.samples.append(text[:SAMPLE_LENGTH])
+            if matched is None:
+                strikes = self._strikes[rule_id] = self._strikes.get(rule_id, 0) + 1
+        if matched is None and strikes >= self.max_strikes:
+            self.remove(rule_id)
+            exhausted.append(rule_id)
+        return bool(matched)
+
+    def stats(self, rule_id: int) -> Optional[RuleStats]:
+        """A snapshot of a rule's counters, or None if it hasn't been evaluated yet"""
+        with self._lock:
+            stats = self._stats.get(rule_id)
+            if stats is None:
+                return None
+            snapshot = RuleStats()
+            snapshot.evaluations, snapshot.matches, snapshot.cpu_time = stats.evaluations, stats.matches, stats.cpu_time
+            snapshot.samples.extend(stats.samples)
+            return snapshot
+
+    def __len__(self) -> int:
+        return len(self._rules) + len(self._shadow)
@@ -1,8 +1,8 @@
 import logging
 import time
-from telegram import Update, ParseMode, BotCommand
+from telegram import Update, ParseMode, BotCommand, Chat, ChatMember, ChatPermissions
 from telegram.ext import CallbackContext
-from telegram.error import BadRequest
+from telegram.error import BadRequest, TelegramError, InvalidToken, RetryAfter
 from config import (
     BOT_NAME,
     START_MESSAGE,
@@ -11,66 +11,173 @@ from config import (
     ADMIN_ID,
     APPROVED_USERS,
     SUDO_USERS,
-    BOT_COMMANDS
+    BOT_COMMANDS,
+    ADMIN_CACHE_TTL,
+    DUPLICATE_FILTER,
+    DUPLICATE_WINDOW,
+    DUPLICATE_BURST_CHATS,
+    DUPLICATE_MAX_ENTRIES,
+    SPAM_MODEL_PATH,
+    SPAM_THRESHOLD,
+    RULE_MAX_STRIKES,
+    WARN_MUTE_DURATION,
+    WARN_HALF_LIFE,
+    COMMAND_USER_RATE,
+    COMMAND_USER_BURST,
+    COMMAND_CHAT_RATE,
+    COMMAND_CHAT_BURST,
+    RAID_WINDOW,
+    RAID_MIN_LOCKDOWN,
+    RAID_MUTE_DURATION,
+    MESSAGE_LOG_PER_CHAT,
+    MESSAGE_LOG_MAX,
+    PURGE_MAX_MESSAGES,
+    PURGE_BATCH_DELAY,
+    GBAN_WORKERS,
+    GBAN_RATE,
+    GBAN_BATCH_SIZE,
+    GBAN_MAX_ATTEMPTS
 )
 from database import Database
+from admin_cache import ChatAdminCache
+from duplicate_detector import NearDuplicateDetector
+from spam_classifier import load_scorer
+from text_pipeline import extract_text_content, check_feature_rules
+from domain_filter import extract_host
+from safe_regex import SafePattern, PatternError
+from rate_limit import TokenBucketLimiter
+from raid_detector import RaidMonitor
+from message_log import MessageLog
+from ban_propagation import BanPropagator
+from edit_diff import message_fingerprint, classify_edit, NO_OP, COSMETIC
+from cache import TTLCache
 from utils import (
-    extract_user_info, is_media_message, is_edited_message, 
-    check_copyright_violation
+    extract_user_info, is_edited_message, 
+    check_copyright_violation, parse_duration, get_media_kind, media_kinds,
+    parse_media_mask, get_allowlist_key, is_allowlisted_media, get_media_file_id,
+    MEDIA_KINDS, ALL_MEDIA_MASK, UNLEARNED_MEDIA_MASK
 )
-from typing import Optional
+from typing import Optional, Set
 
 logger = logging.getLogger(__name__)
 
 db = Database()
+admin_cache = ChatAdminCache(ADMIN_CACHE_TTL)
+duplicate_detector = NearDuplicateDetector(
+    DUPLICATE_WINDOW, DUPLICATE_BURST_CHATS, max_entries=DUPLICATE_MAX_ENTRIES
+)
+spam_scorer = load_scorer(SPAM_MODEL_PATH)
+user_command_limiter = TokenBucketLimiter(COMMAND_USER_RATE / 60, COMMAND_USER_BURST)
+chat_command_limiter = TokenBucketLimiter(COMMAND_CHAT_RATE / 60, COMMAND_CHAT_BURST)
+raid_monitor = RaidMonitor(RAID_WINDOW, RAID_MIN_LOCKDOWN)
+message_log = MessageLog(MESSAGE_LOG_PER_CHAT, MESSAGE_LOG_MAX)
+ban_propagator = BanPropagator(GBAN_WORKERS, GBAN_RATE)
+# (chat_id, user_id) pairs a global ban was recently enforced on, so repeat sightings don't re-call the API
+_gban_enforced = TTLCache(10000, 60)
+# Albums already counted as a violation: (chat_id, user_id, media_group_id); an album arrives
+# as one message per item, all deleted, but earns a single warning point
+_penalized_albums = TTLCache(10000, 60)
+_active_purges: Set[int] = set()  # chat ids with a /purge in progress
+
+# Static responses are rendered once; the command list is published on the first /start
+START_TEXT = START_MESSAGE.format(bot_name=BOT_NAME)
+BOT_COMMAND_LIST = [BotCommand(command, description) for command, description in BOT_COMMANDS]
+_commands_published = False
+
+def is_chat_admin(update: Update, context: CallbackContext, user_id: int) -> bool:
+    """Check if the user administers the current group (cached, no API call per message)"""
+    chat = update.effective_chat
+    if not chat or chat.type == Chat.PRIVATE:
+        return False
+    return admin_cache.is_admin(context.bot, chat.id, user_id)
 
 def get_user_from_message(update: Update, context: CallbackContext) -> tuple[Optional[int], Optional[str]]:
     """Extract user info from command arguments or replied message"""
     try:
         if context.args:
-            logger.debug(f"Extracting user info from arguments: {context.args[0]}")
-            return extract_user_info(context.args[0])
-        elif update.message.reply_to_message:
+            logger.debug("Extracting user info from arguments: %s", context.args[0])
+            user_id, username = extract_user_info(context.args[0])
+            # A non-user argument (e.g. a duration) falls back to the replied message
+            if user_id or username or not update.message.reply_to_message:
+                return user_id, username
+        if update.message.reply_to_message:
             reply_msg = update.message.reply_to_message
             user = reply_msg.from_user
             if user:
-                logger.debug(f"Extracting user info from replied message. User ID: {user.id}, Username: {user.username}")
+                logger.debug("Extracting user info from replied message. User ID: %s, Username: %s", user.id, user.username)
                 return user.id, user.username or str(user.id)
         logger.debug("No user info found in command arguments or reply")
         return None, None
     except Exception as e:
-        logger.error(f"Error in get_user_from_message: {e}")
+        logger.error("Error in get_user_from_message: %s", e)
         return None, None
 
 def send_temp_message(update: Update, context: CallbackContext, text: str):
-    """Send a temporary message that will be deleted after 30 seconds"""
-    message = context.bot.send_message(chat_id=update.effective_chat.id, text=text)
-    context.job_queue.run_once(lambda _: message.delete(), 30)
+    """Send a temporary message that will be deleted after the chat's warning TTL"""
+    chat_id = update.effective_chat.id
+    message = context.bot.send_message(chat_id=chat_id, text=text)
+    context.job_queue.run_once(lambda _: message.delete(), db.get_chat_settings(chat_id).warning_ttl)
     return message
 
+def send_warning(update: Update, context: CallbackContext, text: str):
+    """Post a moderation warning, except during a raid lockdown when the bot stays quiet"""
+    if raid_monitor.is_locked(update.effective_chat.id):
+        return None
+    return send_temp_message(update, context, text)
+
+def can_manage_chat(update: Update, context: CallbackContext, user_id: int) -> bool:
+    """Check if the user may change this chat's settings (owner, sudo or chat admin)"""
+    return user_id == ADMIN_ID or db.is_sudo_user(user_id) or is_chat_admin(update, context, user_id)
+
+def is_command_allowed(update: Update) -> bool:
+    """Apply the per-user and per-chat command rate limits (the bot admin and sudo users are exempt)"""
+    user_id = update.effective_user.id
+    if user_id == ADMIN_ID or db.is_sudo_user(user_id):
+        return True
+    if user_command_limiter.allow(user_id) and chat_command_limiter.allow(update.effective_chat.id):
+        return True
+    logger.debug("Rate limited command from user %s in chat %s", user_id, update.effective_chat.id,
+                 extra={'event': 'command_rate_limited', 'user_id': user_id, 'sampled': True})
+    return False
+
+def send_command_reply(update: Update, context: CallbackContext, text: str, permanent: bool = False, **kwargs):
+    """Answer an informational command, in the user's private chat if the group asks for that.
+
+    Falls back to the group when the user hasn't started a private chat with the bot.
+    """
+    chat = update.effective_chat
+    if chat.type != Chat.PRIVATE and db.get_chat_settings(chat.id).private_replies:
+        try:
+            context.bot.send_message(chat_id=update.effective_user.id, text=text, **kwargs)
+            return
+        except TelegramError:
+            pass
+    if permanent:
+        context.bot.send_message(chat_id=chat.id, text=text, **kwargs)
+    else:
+        send_temp_message(update, context, text)
+
 def start_command(update: Update, context: CallbackContext):
     """Handle the /start command"""
+    global _commands_published
     try:
-        # Set bot commands for the user
-        commands = [
-            BotCommand(command, description) for command, description in BOT_COMMANDS
-        ]
-        context.bot.set_my_commands(commands)
+        if not is_command_allowed(update):
+            return
+
+        # Set bot commands once per process
+        if not _commands_published:
+            context.bot.set_my_commands(BOT_COMMAND_LIST)
+            _commands_published = True
         
         # Send welcome message with owner info (permanent message)
-        welcome_text = START_MESSAGE.format(bot_name=BOT_NAME)
-        context.bot.send_message(
-            chat_id=update.effective_chat.id,
-            text=welcome_text,
-            parse_mode=ParseMode.HTML,
-            disable_web_page_preview=True
-        )
+        send_command_reply(update, context, START_TEXT, permanent=True,
+                           parse_mode=ParseMode.HTML, disable_web_page_preview=True)
         
         # Log successful start command
-        logger.info(f"Start command executed by user {update.effective_user.id}")
+        logger.info("Start command executed by user %s", update.effective_user.id)
         
     except Exception as e:
-        logger.error(f"Error in /start command: {e}")
+        logger.error("Error in /start command: %s", e)
         # Send error message to user
         context.bot.send_message(
             chat_id=update.effective_chat.id,
@@ -80,13 +187,12 @@ def start_command(update: Update, context: CallbackContext):
 def help_command(update: Update, context: CallbackContext):
     """Handle the /help command"""
     try:
+        if not is_command_allowed(update):
+            return
         # Send help message (permanent message)
-        context.bot.send_message(
-            chat_id=update.effective_chat.id,
-            text=HELP_MESSAGE
-        )
+        send_command_reply(update, context, HELP_MESSAGE, permanent=True)
     except Exception as e:
-        logger.error(f"Error in /help command: {e}")
+        logger.error("Error in /help command: %s", e)
 
 def approve_command(update: Update, context: CallbackContext):
     """Handle the /approve command"""
@@ -106,21 +212,30 @@ def approve_command(update: Update, context: CallbackContext):
             send_temp_message(update, context, "❌ Please provide a user ID/username or reply to a user's message to approve them.")
             return
 
-        logger.debug(f"Attempting to approve user. ID: {target_user_id}, Username: {username}")
+        if not target_user_id:
+            target_user_id = db.get_user_id_by_username(username)
+
+        # Optional trailing duration makes the approval time-limited
+        duration = parse_duration(context.args[-1]) if context.args else None
+        expires_at = int(time.time()) + duration if duration else None
+        until = f" until {time.strftime('%Y-%m-%d %H:%M', time.gmtime(expires_at))} UTC" if expires_at else ""
+
+        logger.debug("Attempting to approve user. ID: %s, Username: %s", target_user_id, username)
         if target_user_id:
-            if db.add_approved_user(target_user_id, username or str(target_user_id), user_id):
-                send_temp_message(update, context, f"✅ User {target_user_id} has been approved.")
-                logger.info(f"User {target_user_id} approved by {user_id}")
+            if db.add_approved_user(target_user_id, username or str(target_user_id), user_id, expires_at):
+                send_temp_message(update, context, f"✅ User {target_user_id} has been approved{until}.")
+                logger.info("User %s approved by %s", target_user_id, user_id)
             else:
                 send_temp_message(update, context, "❌ Failed to approve user.")
         elif username:
-            if db.add_approved_user(0, username, user_id):  # Using 0 as temporary ID
-                send_temp_message(update, context, f"✅ User {username} has been approved.")
-                logger.info(f"User {username} approved by {user_id}")
+            # The id is bound the first time this username is seen in a chat
+            if db.add_pending_username(username, 'approved', user_id, expires_at):
+                send_temp_message(update, context, f"✅ User {username} has been approved{until}.")
+                logger.info("User %s approved (pending) by %s", username, user_id)
             else:
                 send_temp_message(update, context, "❌ Failed to approve user.")
     except Exception as e:
-        logger.error(f"Error in /approve command: {e}")
+        logger.error("Error in /approve command: %s", e)
 
 def disapprove_command(update: Update, context: CallbackContext):
     """Handle the /disapprove command"""
@@ -135,15 +250,27 @@ def disapprove_command(update: Update, context: CallbackContext):
             send_temp_message(update, context, "❌ Please provide a user ID/username or reply to a user's message to disapprove them.")
             return
 
-        logger.debug(f"Attempting to disapprove user. ID: {user_id}")
+        pending_removed = False
+        if not user_id:
+            user_id = db.get_user_id_by_username(username)
+            # Cancel any grant still waiting for this username as well
+            pending_removed = db.remove_pending_username(username, 'approved')
+
+        logger.debug("Attempting to disapprove user. ID: %s", user_id)
         if user_id:
             if db.remove_approved_user(user_id):
                 send_temp_message(update, context, f"✅ User {user_id} has been disapproved.")
-                logger.info(f"User {user_id} disapproved by {update.effective_user.id}")
+                logger.info("User %s disapproved by %s", user_id, update.effective_user.id)
             else:
                 send_temp_message(update, context, "❌ Failed to disapprove user.")
+        elif username:
+            if pending_removed:
+                send_temp_message(update, context, f"✅ User {username} has been disapproved.")
+                logger.info("Pending approval for %s removed by %s", username, update.effective_user.id)
+            else:
+                send_temp_message(update, context, f"❌ No pending approval found for {username}.")
     except Exception as e:
-        logger.error(f"Error in /disapprove command: {e}")
+        logger.error("Error in /disapprove command: %s", e)
 
 def addsudo_command(update: Update, context: CallbackContext):
     """Handle the /addsudo command"""
@@ -163,21 +290,25 @@ def addsudo_command(update: Update, context: CallbackContext):
             send_temp_message(update, context, "❌ Please provide a user ID/username or reply to a user's message to add them as sudo.")
             return
 
-        logger.debug(f"Attempting to add sudo user. ID: {target_user_id}, Username: {username}")
+        if not target_user_id:
+            target_user_id = db.get_user_id_by_username(username)
+
+        logger.debug("Attempting to add sudo user. ID: %s, Username: %s", target_user_id, username)
         if target_user_id:
             if db.add_sudo_user(target_user_id, username or str(target_user_id), user_id):
                 send_temp_message(update, context, f"✅ User {target_user_id} has been added as sudo.")
-                logger.info(f"User {target_user_id} added as sudo by {user_id}")
+                logger.info("User %s added as sudo by %s", target_user_id, user_id)
             else:
                 send_temp_message(update, context, "❌ Failed to add sudo user.")
         elif username:
-            if db.add_sudo_user(0, username, user_id):  # Using 0 as temporary ID
+            # The id is bound the first time this username is seen in a chat
+            if db.add_pending_username(username, 'sudo', user_id):
                 send_temp_message(update, context, f"✅ User {username} has been added as sudo.")
-                logger.info(f"User {username} added as sudo by {user_id}")
+                logger.info("User %s added as sudo (pending) by %s", username, user_id)
             else:
                 send_temp_message(update, context, "❌ Failed to add sudo user.")
     except Exception as e:
-        logger.error(f"Error in /addsudo command: {e}")
+        logger.error("Error in /addsudo command: %s", e)
 
 def removesudo_command(update: Update, context: CallbackContext):
     """Handle the /removesudo command"""
@@ -192,24 +323,36 @@ def removesudo_command(update: Update, context: CallbackContext):
             send_temp_message(update, context, "❌ Please provide a user ID/username or reply to a user's message to remove them from sudo.")
             return
 
-        logger.debug(f"Attempting to remove sudo user. ID: {user_id}")
+        pending_removed = False
+        if not user_id:
+            user_id = db.get_user_id_by_username(username)
+            pending_removed = db.remove_pending_username(username, 'sudo')
+
+        logger.debug("Attempting to remove sudo user. ID: %s", user_id)
         if user_id:
             if db.remove_sudo_user(user_id):
                 send_temp_message(update, context, f"✅ User {user_id} has been removed from sudo.")
-                logger.info(f"User {user_id} removed from sudo by admin")
+                logger.info("User %s removed from sudo by admin", user_id)
             else:
                 send_temp_message(update, context, "❌ Failed to remove sudo user.")
+        elif username:
+            if pending_removed:
+                send_temp_message(update, context, f"✅ User {username} has been removed from sudo.")
+                logger.info("Pending sudo for %s removed by admin", username)
+            else:
+                send_temp_message(update, context, f"❌ No pending sudo grant found for {username}.")
     except Exception as e:
-        logger.error(f"Error in /removesudo command: {e}")
+        logger.error("Error in /removesudo command: %s", e)
 
 def status_command(update: Update, context: CallbackContext):
     """Handle the /status command"""
     try:
-        if not update.message:
+        if not update.message or not is_command_allowed(update):
             return
 
         user_id = update.effective_user.id
-        is_approved = db.is_user_approved(user_id)
+        expires_at = db.get_approval_expiry(user_id)
+        is_approved = expires_at is not None and expires_at > time.time()
         is_sudo = db.is_sudo_user(user_id)
 
         status = []
@@ -217,15 +360,1091 @@ def status_command(update: Update, context: CallbackContext):
             status.append("👑 You are the bot admin")
         if is_sudo:
             status.append("⭐ You are a sudo user")
-        if is_approved:
+        if is_approved and expires_at != float('inf'):
+            status.append(f"✅ You are an approved user until {time.strftime('%Y-%m-%d %H:%M', time.gmtime(expires_at))} UTC")
+        elif is_approved:
             status.append("✅ You are an approved user")
         if not any([user_id == ADMIN_ID, is_sudo, is_approved]):
             status.append("❌ You are not approved")
 
-        logger.debug(f"Status check for user {user_id}: Admin={user_id == ADMIN_ID}, Sudo={is_sudo}, Approved={is_approved}")
-        send_temp_message(update, context, "\n".join(status))
+        logger.debug("Status check for user %s: Admin=%s, Sudo=%s, Approved=%s", user_id, user_id == ADMIN_ID, is_sudo, is_approved)
+        send_command_reply(update, context, "\n".join(status))
+    except Exception as e:
+        logger.error("Error in /status command: %s", e)
+
+def members_command(update: Update, context: CallbackContext):
+    """Handle the /members command"""
+    try:
+        if not update.message:
+            return
+
+        user_id = update.effective_user.id
+        if user_id != ADMIN_ID and not db.is_sudo_user(user_id):
+            send_temp_message(update, context, "❌ You don't have permission to list members.")
+            return
+
+        seen = db.get_seen_users(update.effective_chat.id)
+        if not seen:
+            send_temp_message(update, context, "ℹ️ No members have been seen in this chat yet.")
+            return
+
+        lines = ["👥 Recently seen members:"]
+        for seen_id, seen_username, last_seen in seen:
+            name = f"@{seen_username}" if seen_username else "—"
+            lines.append(f"• {seen_id} {name} ({time.strftime('%Y-%m-%d %H:%M', time.gmtime(last_seen))} UTC)")
+        send_temp_message(update, context, "\n".join(lines))
+    except Exception as e:
+        logger.error("Error in /members command: %s", e)
+
+_ON_OFF = {'on': True, 'off': False, 'yes': True, 'no': False, 'true': True, 'false': False, '1': True, '0': False}
+
+def format_media_mask(mask: int) -> str:
+    """Render a media bitmask as kind names"""
+    if mask == ALL_MEDIA_MASK:
+        return "all"
+    return ", ".join(media_kinds(mask)) or "none"
+
+def format_chat_settings(settings) -> str:
+    """Render a chat's settings for display"""
+    return (
+        "⚙️ Chat settings:\n"
+        f"• edits: {settings.edit_policy if settings.delete_edits else 'off'} (delete edited messages: content changes, or all)\n"
+        f"• copyright: {'on' if settings.copyright_filter else 'off'} (copyright filter)\n"
+        f"• media: {format_media_mask(settings.unapproved_media_mask)} (allowed for unapproved users)\n"
+        f"• approvedmedia: {format_media_mask(settings.approved_media_mask)} (allowed for approved users)\n"
+        f"• links: {settings.link_policy} (link moderation policy)\n"
+        f"• forwards: {settings.forward_policy} (channel forwards: allow, approved or block)\n"
+        f"• invites: {'on' if settings.block_invite_links else 'off'} (delete Telegram invite links)\n"
+        f"• mentions: {settings.max_mentions or 'off'} (max @mentions per message)\n"
+        f"• caps: {str(settings.max_caps_percent) + '%' if settings.max_caps_percent else 'off'} (max uppercase share)\n"
+        f"• emoji: {str(settings.max_emoji_percent) + '%' if settings.max_emoji_percent else 'off'} (max emoji share)\n"
+        f"• mute: {settings.mute_threshold or 'off'} (warning points before a mute)\n"
+        f"• kick: {settings.kick_threshold or 'off'} (warning points before a kick)\n"
+        f"• raid: {settings.raid_threshold or 'off'} (joins per {RAID_WINDOW}s that start a lockdown)\n"
+        f"• warnttl: {settings.warning_ttl}s (warning auto-delete delay)\n"
+        f"• private: {'on' if settings.private_replies else 'off'} (answer /start, /help, /status in private)\n\n"
+        "Change with /set edits <content|all|off>, /set <copyright|invites|private> <on|off>, /set <media|approvedmedia> <all|none|kind,kind>, "
+        "/set links <blocklist|allowlist|off>, /set forwards <allow|approved|block>, "
+        "/set <mentions|caps|emoji|mute|kick|raid> <number, 0 = off>, "
+        "/set warnttl <seconds>\n"
+        f"Media kinds: {', '.join(MEDIA_KINDS)}"
+    )
+
+def settings_command(update: Update, context: CallbackContext):
+    """Handle the /settings command"""
+    try:
+        if not update.message or not is_command_allowed(update):
+            return
+        send_temp_message(update, context, format_chat_settings(db.get_chat_settings(update.effective_chat.id)))
+    except Exception as e:
+        logger.error("Error in /settings command: %s", e)
+
+def set_command(update: Update, context: CallbackContext):
+    """Handle the /set command"""
+    try:
+        if not update.message:
+            return
+
+        user_id = update.effective_user.id
+        if not can_manage_chat(update, context, user_id):
+            send_temp_message(update, context, "❌ You don't have permission to change chat settings.")
+            return
+
+        if len(context.args) != 2:
+            send_temp_message(update, context, "❌ Usage: /set <edits|copyright|media|approvedmedia|links|forwards|invites|mentions|caps|emoji|mute|kick|raid|warnttl|private> <value>")
+            return
+
+        key, value = context.args[0].lower(), context.args[1].lower()
+        changes = {}
+        if key == 'edits' and value in ('content', 'all'):
+            changes['delete_edits'] = True
+            changes['edit_policy'] = value
+        elif key in ('edits', 'copyright') and value in _ON_OFF:
+            changes['delete_edits' if key == 'edits' else 'copyright_filter'] = _ON_OFF[value]
+        elif key in ('media', 'approvedmedia'):
+            mask = parse_media_mask(value)
+            if mask is None:
+                send_temp_message(update, context, f"❌ Media kinds must be 'all', 'none' or from: {', '.join(MEDIA_KINDS)}")
+                return
+            changes['unapproved_media_mask' if key == 'media' else 'approved_media_mask'] = mask
+        elif key == 'links' and value in ('blocklist', 'allowlist', 'off'):
+            changes['link_policy'] = value
+        elif key == 'invites' and value in _ON_OFF:
+            changes['block_invite_links'] = _ON_OFF[value]
+        elif key == 'mentions' and value.isdigit():
+            changes['max_mentions'] = int(value)
+        elif key in ('caps', 'emoji') and value.isdigit() and int(value) <= 100:
+            changes['max_caps_percent' if key == 'caps' else 'max_emoji_percent'] = int(value)
+        elif key in ('mute', 'kick') and value.isdigit() and int(value) <= 100:
+            changes['mute_threshold' if key == 'mute' else 'kick_threshold'] = int(value)
+        elif key == 'forwards' and value in ('allow', 'approved', 'block'):
+            changes['forward_policy'] = value
+        elif key == 'raid' and value.isdigit() and int(value) <= 1000:
+            changes['raid_threshold'] = int(value)
+        elif key == 'private' and value in _ON_OFF:
+            changes['private_replies'] = _ON_OFF[value]
+        elif key == 'warnttl' and value.isdigit() and 5 <= int(value) <= 86400:
+            changes['warning_ttl'] = int(value)
+        else:
+            send_temp_message(update, context, "❌ Invalid setting or value. Use /settings to see the options.")
+            return
+
+        settings = db.update_chat_settings(update.effective_chat.id, user_id, **changes)
+        if settings:
+            send_temp_message(update, context, "✅ Setting updated.\n\n" + format_chat_settings(settings))
+            logger.info("Chat %s setting %s set to %s by %s", update.effective_chat.id, key, value, user_id)
+        else:
+            send_temp_message(update, context, "❌ Failed to update setting.")
+    except Exception as e:
+        logger.error("Error in /set command: %s", e)
+
+def _allowlist_target(update: Update, context: CallbackContext):
+    """Work out the allowlist entry from a replied sticker/GIF or a sticker set name argument"""
+    reply = update.message.reply_to_message
+    if reply:
+        return get_allowlist_key(reply)
+    if context.args:
+        return 'sticker_set', context.args[0]
+    return None, None
+
+def allowmedia_command(update: Update, context: CallbackContext):
+    """Handle the /allowmedia command"""
+    try:
+        if not update.message:
+            return
+
+        user_id = update.effective_user.id
+        if not can_manage_chat(update, context, user_id):
+            send_temp_message(update, context, "❌ You don't have permission to change the media allowlist.")
+            return
+
+        kind, value = _allowlist_target(update, context)
+        if not kind:
+            send_temp_message(update, context, "❌ Reply to a sticker or GIF, or provide a sticker set name.")
+            return
+
+        if db.add_media_allowlist(update.effective_chat.id, kind, value, user_id):
+            label = "Sticker set" if kind == 'sticker_set' else "GIF"
+            send_temp_message(update, context, f"✅ {label} {value} is now allowed for everyone in this chat.")
+            logger.info("Chat %s allowlisted %s %s by %s", update.effective_chat.id, kind, value, user_id)
+        else:
+            send_temp_message(update, context, "❌ Failed to update the media allowlist.")
+    except Exception as e:
+        logger.error("Error in /allowmedia command: %s", e)
+
+def disallowmedia_command(update: Update, context: CallbackContext):
+    """Handle the /disallowmedia command"""
+    try:
+        if not update.message:
+            return
+
+        user_id = update.effective_user.id
+        if not can_manage_chat(update, context, user_id):
+            send_temp_message(update, context, "❌ You don't have permission to change the media allowlist.")
+            return
+
+        kind, value = _allowlist_target(update, context)
+        if not kind:
+            send_temp_message(update, context, "❌ Reply to a sticker or GIF, or provide a sticker set name.")
+            return
+
+        if db.remove_media_allowlist(update.effective_chat.id, kind, value):
+            send_temp_message(update, context, f"✅ {value} has been removed from the media allowlist.")
+            logger.info("Chat %s removed %s %s from allowlist by %s", update.effective_chat.id, kind, value, user_id)
+        else:
+            send_temp_message(update, context, f"❌ {value} is not on the media allowlist.")
     except Exception as e:
-        logger.error(f"Error in /status command: {e}")
+        logger.error("Error in /disallowmedia command: %s", e)
+
+def _blockmedia_target(update: Update, context: CallbackContext) -> Optional[str]:
+    """Work out the file_unique_id from a replied media message or an argument"""
+    reply = update.message.reply_to_message
+    if reply:
+        return get_media_file_id(reply)
+    if context.args:
+        return context.args[0]
+    return None
+
+def blockmedia_command(update: Update, context: CallbackContext):
+    """Handle the /blockmedia command"""
+    try:
+        if not update.message or update.effective_user.id != ADMIN_ID:
+            send_temp_message(update, context, "❌ Only the bot admin can block media globally.")
+            return
+
+        file_unique_id = _blockmedia_target(update, context)
+        if not file_unique_id:
+            send_temp_message(update, context, "❌ Reply to a media message or provide a file_unique_id.")
+            return
+
+        if db.add_blocked_media(file_unique_id, 'owner', update.effective_user.id):
+            reply = update.message.reply_to_message
+            if reply:
+                try:
+                    reply.delete()
+                except BadRequest:
+                    pass
+            send_temp_message(update, context, f"✅ Media {file_unique_id} is now blocked in every chat.")
+            logger.info("Media %s blocked by admin", file_unique_id)
+        else:
+            send_temp_message(update, context, "❌ Failed to block media.")
+    except Exception as e:
+        logger.error("Error in /blockmedia command: %s", e)
+
+def unblockmedia_command(update: Update, context: CallbackContext):
+    """Handle the /unblockmedia command"""
+    try:
+        if not update.message or update.effective_user.id != ADMIN_ID:
+            send_temp_message(update, context, "❌ Only the bot admin can unblock media.")
+            return
+
+        file_unique_id = _blockmedia_target(update, context)
+        if not file_unique_id:
+            send_temp_message(update, context, "❌ Provide a file_unique_id to unblock.")
+            return
+
+        if db.remove_blocked_media(file_unique_id):
+            send_temp_message(update, context, f"✅ Media {file_unique_id} has been unblocked.")
+            logger.info("Media %s unblocked by admin", file_unique_id)
+        else:
+            send_temp_message(update, context, f"❌ Media {file_unique_id} is not blocked.")
+    except Exception as e:
+        logger.error("Error in /unblockmedia command: %s", e)
+
+def _domain_rule_command(update: Update, context: CallbackContext, rule: Optional[str]):
+    """Shared body of /blockdomain, /allowdomain and /removedomain (rule None removes)"""
+    user_id = update.effective_user.id
+    if not context.args:
+        send_temp_message(update, context, "❌ Please provide a domain, e.g. example.com (add 'global' for all chats).")
+        return
+
+    domain = extract_host(context.args[0])
+    is_global = len(context.args) > 1 and context.args[1].lower() == 'global'
+    if not domain:
+        send_temp_message(update, context, "❌ That doesn't look like a domain.")
+        return
+    if is_global and user_id != ADMIN_ID:
+        send_temp_message(update, context, "❌ Only the bot admin can change global domain rules.")
+        return
+    if not is_global and not can_manage_chat(update, context, user_id):
+        send_temp_message(update, context, "❌ You don't have permission to change domain rules.")
+        return
+
+    scope = 0 if is_global else update.effective_chat.id
+    where = "globally" if is_global else "in this chat"
+    if rule is None:
+        if db.remove_domain_rule(scope, domain):
+            send_temp_message(update, context, f"✅ Rule for {domain} removed {where}.")
+            logger.info("Domain rule for %s removed in scope %s by %s", domain, scope, user_id)
+        else:
+            send_temp_message(update, context, f"❌ No rule for {domain} {where}.")
+    elif db.set_domain_rule(scope, domain, rule, user_id):
+        verb = "blocked" if rule == 'block' else "allowed"
+        send_temp_message(update, context, f"✅ {domain} and its subdomains are now {verb} {where}.")
+        logger.info("Domain %s %s in scope %s by %s", domain, verb, scope, user_id)
+    else:
+        send_temp_message(update, context, "❌ Failed to update domain rule.")
+
+def blockdomain_command(update: Update, context: CallbackContext):
+    """Handle the /blockdomain command"""
+    try:
+        if update.message:
+            _domain_rule_command(update, context, 'block')
+    except Exception as e:
+        logger.error("Error in /blockdomain command: %s", e)
+
+def allowdomain_command(update: Update, context: CallbackContext):
+    """Handle the /allowdomain command"""
+    try:
+        if update.message:
+            _domain_rule_command(update, context, 'allow')
+    except Exception as e:
+        logger.error("Error in /allowdomain command: %s", e)
+
+def removedomain_command(update: Update, context: CallbackContext):
+    """Handle the /removedomain command"""
+    try:
+        if update.message:
+            _domain_rule_command(update, context, None)
+    except Exception as e:
+        logger.error("Error in /removedomain command: %s", e)
+
+def domains_command(update: Update, context: CallbackContext):
+    """Handle the /domains command"""
+    try:
+        if not update.message or not is_command_allowed(update):
+            return
+
+        chat_id = update.effective_chat.id
+        settings = db.get_chat_settings(chat_id)
+        lines = [f"🔗 Link policy: {settings.link_policy}"]
+        for title, scope in (("Chat rules", chat_id), ("Global rules", 0)):
+            rules = db.get_domain_rules(scope)
+            if rules:
+                lines.append(f"\n{title}:")
+                lines.extend(f"• {domain}: {rule}" for domain, rule in rules)
+        hits = db.get_domain_hits(chat_id)
+        if hits:
+            lines.append("\nMost deleted domains:")
+            lines.extend(f"• {domain}: {count}" for domain, count in hits)
+        send_temp_message(update, context, "\n".join(lines))
+    except Exception as e:
+        logger.error("Error in /domains command: %s", e)
+
+def _channel_rule_command(update: Update, context: CallbackContext, rule: Optional[str]):
+    """Shared body of /allowchannel, /denychannel and /removechannel (rule None removes)"""
+    user_id = update.effective_user.id
+    if not can_manage_chat(update, context, user_id):
+        send_temp_message(update, context, "❌ You don't have permission to change channel rules.")
+        return
+
+    reply = update.message.reply_to_message
+    if reply and reply.forward_from_chat:
+        channel_id, title = reply.forward_from_chat.id, reply.forward_from_chat.title
+    elif context.args and context.args[0].lstrip('-').isdigit():
+        channel_id, title = int(context.args[0]), None
+    else:
+        send_temp_message(update, context, "❌ Reply to a forwarded channel post or provide the channel ID.")
+        return
+
+    chat_id = update.effective_chat.id
+    label = title or channel_id
+    if rule is None:
+        if db.remove_channel_rule(chat_id, channel_id):
+            send_temp_message(update, context, f"✅ Rule for channel {label} removed.")
+        else:
+            send_temp_message(update, context, f"❌ No rule for channel {label}.")
+    elif db.set_channel_rule(chat_id, channel_id, title, rule, user_id):
+        verb = "always allowed" if rule == 'allow' else "always deleted"
+        send_temp_message(update, context, f"✅ Forwards from channel {label} are now {verb}.")
+        logger.info("Channel %s rule %s in chat %s by %s", channel_id, rule, chat_id, user_id)
+    else:
+        send_temp_message(update, context, "❌ Failed to update channel rule.")
+
+def allowchannel_command(update: Update, context: CallbackContext):
+    """Handle the /allowchannel command"""
+    try:
+        if update.message:
+            _channel_rule_command(update, context, 'allow')
+    except Exception as e:
+        logger.error("Error in /allowchannel command: %s", e)
+
+def denychannel_command(update: Update, context: CallbackContext):
+    """Handle the /denychannel command"""
+    try:
+        if update.message:
+            _channel_rule_command(update, context, 'deny')
+    except Exception as e:
+        logger.error("Error in /denychannel command: %s", e)
+
+def removechannel_command(update: Update, context: CallbackContext):
+    """Handle the /removechannel command"""
+    try:
+        if update.message:
+            _channel_rule_command(update, context, None)
+    except Exception as e:
+        logger.error("Error in /removechannel command: %s", e)
+
+def channels_command(update: Update, context: CallbackContext):
+    """Handle the /channels command"""
+    try:
+        if not update.message or not is_command_allowed(update):
+            return
+
+        chat_id = update.effective_chat.id
+        lines = [f"📢 Forward policy: {db.get_chat_settings(chat_id).forward_policy}"]
+        rules = db.get_channel_rule_list(chat_id)
+        if rules:
+            lines.append("\nChannel rules:")
+            lines.extend(f"• {title or channel_id} ({channel_id}): {rule}" for channel_id, title, rule in rules)
+        stats = db.get_forward_stats(chat_id)
+        if stats:
+            lines.append("\nTop forward sources (forwarded / deleted):")
+            lines.extend(f"• {title or channel_id}: {seen} / {deleted}" for channel_id, title, seen, deleted in stats)
+        send_temp_message(update, context, "\n".join(lines))
+    except Exception as e:
+        logger.error("Error in /channels command: %s", e)
+
+def _add_rule_command(update: Update, context: CallbackContext, shadow: bool):
+    """Shared body of /addrule and /shadowrule"""
+    if update.effective_user.id != ADMIN_ID:
+        send_temp_message(update, context, "❌ Only the bot admin can manage filter rules.")
+        return
+
+    # Keep the pattern verbatim, including spaces
+    pattern = update.message.text.partition(' ')[2].strip()
+    if not pattern:
+        send_temp_message(update, context, f"❌ Usage: /{'shadowrule' if shadow else 'addrule'} <pattern>")
+        return
+    try:
+        compiled = SafePattern(pattern)
+    except PatternError as e:
+        send_temp_message(update, context, f"❌ Invalid pattern: {e}")
+        return
+
+    rule_id = db.add_filter_rule(compiled, update.effective_user.id, shadow)
+    if rule_id is None:
+        send_temp_message(update, context, "❌ Failed to add filter rule.")
+    elif shadow:
+        send_temp_message(update, context, f"✅ Shadow rule #{rule_id} added. Check it with /rules {rule_id}, "
+                                           f"then go live with /promoterule {rule_id}.")
+        logger.info("Shadow filter rule %s added: %s", rule_id, pattern)
+    else:
+        send_temp_message(update, context, f"✅ Filter rule #{rule_id} added.")
+        logger.info("Filter rule %s added: %s", rule_id, pattern)
+
+def addrule_command(update: Update, context: CallbackContext):
+    """Handle the /addrule command"""
+    try:
+        if update.message:
+            _add_rule_command(update, context, False)
+    except Exception as e:
+        logger.error("Error in /addrule command: %s", e)
+
+def shadowrule_command(update: Update, context: CallbackContext):
+    """Handle the /shadowrule command"""
+    try:
+        if update.message:
+            _add_rule_command(update, context, True)
+    except Exception as e:
+        logger.error("Error in /shadowrule command: %s", e)
+
+def _rule_id_argument(update: Update, context: CallbackContext) -> Optional[int]:
+    """Parse the rule ID argument of /delrule and /enablerule, replying with usage if missing"""
+    if context.args and context.args[0].lstrip('#').isdigit():
+        return int(context.args[0].lstrip('#'))
+    send_temp_message(update, context, "❌ Please provide a rule ID (see /rules).")
+    return None
+
+def delrule_command(update: Update, context: CallbackContext):
+    """Handle the /delrule command"""
+    try:
+        if not update.message or update.effective_user.id != ADMIN_ID:
+            send_temp_message(update, context, "❌ Only the bot admin can manage filter rules.")
+            return
+
+        rule_id = _rule_id_argument(update, context)
+        if rule_id is None:
+            return
+        if db.remove_filter_rule(rule_id):
+            send_temp_message(update, context, f"✅ Filter rule #{rule_id} deleted.")
+            logger.info("Filter rule %s deleted", rule_id)
+        else:
+            send_temp_message(update, context, f"❌ No filter rule #{rule_id}.")
+    except Exception as e:
+        logger.error("Error in /delrule command: %s", e)
+
+def _update_rule_command(update: Update, context: CallbackContext, done: str, **changes):
+    """Shared body of /enablerule and /promoterule"""
+    if update.effective_user.id != ADMIN_ID:
+        send_temp_message(update, context, "❌ Only the bot admin can manage filter rules.")
+        return
+
+    rule_id = _rule_id_argument(update, context)
+    if rule_id is None:
+        return
+    if db.update_filter_rule(rule_id, **changes):
+        send_temp_message(update, context, f"✅ Filter rule #{rule_id} {done}.")
+        logger.info("Filter rule %s %s", rule_id, done)
+    else:
+        send_temp_message(update, context, f"❌ No filter rule #{rule_id}.")
+
+def enablerule_command(update: Update, context: CallbackContext):
+    """Handle the /enablerule command"""
+    try:
+        if update.message:
+            _update_rule_command(update, context, "enabled", enabled=True)
+    except Exception as e:
+        logger.error("Error in /enablerule command: %s", e)
+
+def promoterule_command(update: Update, context: CallbackContext):
+    """Handle the /promoterule command"""
+    try:
+        if update.message:
+            _update_rule_command(update, context, "is now live", enabled=True, shadow=False)
+    except Exception as e:
+        logger.error("Error in /promoterule command: %s", e)
+
+def format_rule_stats(stats) -> str:
+    """One-line summary of a filter_rules.RuleStats"""
+    if stats is None:
+        return "not evaluated yet"
+    return (f"{stats.matches}/{stats.evaluations} matched ({stats.hit_rate:.2%}), "
+            f"avg {stats.average_cost * 1e6:.0f}µs, total {stats.cpu_time * 1000:.1f}ms CPU")
+
+def rules_command(update: Update, context: CallbackContext):
+    """Handle the /rules command"""
+    try:
+        if not update.message or update.effective_user.id != ADMIN_ID:
+            send_temp_message(update, context, "❌ Only the bot admin can view filter rules.")
+            return
+
+        rules = db.get_filter_rules()
+        if context.args:
+            # Details and recent matches of one rule, to review it for false positives
+            rule_id = _rule_id_argument(update, context)
+            if rule_id is None:
+                return
+            rule = next((rule for rule in rules if rule[0] == rule_id), None)
+            if rule is None:
+                send_temp_message(update, context, f"❌ No filter rule #{rule_id}.")
+                return
+            stats = db.get_filter_rule_stats(rule_id)
+            lines = [f"🧾 Rule #{rule_id}: {rule[1]}", format_rule_stats(stats)]
+            if stats and stats.samples:
+                lines.append("\nRecent matches:")
+                lines.extend(f"• {sample}" for sample in stats.samples)
+            send_temp_message(update, context, "\n".join(lines))
+            return
+
+        if not rules:
+            send_temp_message(update, context, "No filter rules. Add one with /addrule or /shadowrule <pattern>.")
+            return
+        lines = ["🧾 Filter rules:"]
+        for rule_id, pattern, enabled, shadow, reason in rules:
+            if not enabled:
+                status = f"off ({reason})" if reason else "off"
+            else:
+                status = "shadow" if shadow else "live"
+            lines.append(f"• #{rule_id} [{status}] {pattern}\n  {format_rule_stats(db.get_filter_rule_stats(rule_id))}")
+        send_temp_message(update, context, "\n".join(lines))
+    except Exception as e:
+        logger.error("Error in /rules command: %s", e)
+
+def report_disabled_rules(context: CallbackContext, rule_ids):
+    """Tell the bot admin about filter rules disabled for exceeding their time budget"""
+    for rule_id in rule_ids:
+        logger.warning("Filter rule %s disabled: exceeded its time budget %s times", rule_id, RULE_MAX_STRIKES)
+        try:
+            context.bot.send_message(
+                chat_id=ADMIN_ID,
+                text=(f"⚠️ Filter rule #{rule_id} was disabled after exceeding its time budget "
+                      f"{RULE_MAX_STRIKES} times. Simplify it, or re-enable it with /enablerule {rule_id}.")
+            )
+        except Exception as e:
+            logger.error("Error reporting disabled filter rule: %s", e)
+
+def record_violation(update: Update, context: CallbackContext, settings, user_id: int):
+    """Add a warning point for a deleted message and mute or kick the user at the chat's thresholds"""
+    chat_id = update.effective_chat.id
+    media_group_id = update.message.media_group_id if update.message else None
+    if media_group_id:
+        if (chat_id, user_id, media_group_id) in _penalized_albums:
+            return
+        _penalized_albums.set((chat_id, user_id, media_group_id), True)
+    score = db.add_warning_points(chat_id, user_id)
+    name = update.effective_user.first_name or str(user_id)
+    try:
+        if settings.kick_threshold and score >= settings.kick_threshold:
+            # Ban then unban: removes the user but lets them rejoin later
+            context.bot.ban_chat_member(chat_id, user_id)
+            context.bot.unban_chat_member(chat_id, user_id, only_if_banned=True)
+            db.reset_warning_points(chat_id, user_id)
+            send_warning(update, context, f"👢 {name} was removed after repeated violations.")
+            logger.info("Kicked user %s from chat %s at %.1f warning points", user_id, chat_id, score)
+        elif settings.mute_threshold and score >= settings.mute_threshold:
+            context.bot.restrict_chat_member(
+                chat_id, user_id, ChatPermissions(can_send_messages=False),
+                until_date=int(time.time()) + WARN_MUTE_DURATION
+            )
+            send_warning(update, context, f"🔇 {name} was muted for {WARN_MUTE_DURATION // 60} minutes "
+                                          f"after repeated violations.")
+            logger.info("Muted user %s in chat %s at %.1f warning points", user_id, chat_id, score)
+    except TelegramError as e:
+        # Typically the bot lacks the ban/restrict right in this chat
+        logger.warning("Could not escalate warnings for user %s in chat %s: %s", user_id, chat_id, e)
+
+def _warn_target(update: Update, context: CallbackContext) -> Optional[int]:
+    """User id for /warns and /resetwarns from a reply, an id or a seen @username"""
+    user_id, username = get_user_from_message(update, context)
+    if not user_id and username:
+        user_id = db.get_user_id_by_username(username)
+    return user_id
+
+def warns_command(update: Update, context: CallbackContext):
+    """Handle the /warns command"""
+    try:
+        if not update.message or not is_command_allowed(update):
+            return
+
+        caller_id = update.effective_user.id
+        target_id = _warn_target(update, context) if (context.args or update.message.reply_to_message) else caller_id
+        if not target_id:
+            send_temp_message(update, context, "❌ User not found. Reply to their message or use a user ID.")
+            return
+        if target_id != caller_id and not can_manage_chat(update, context, caller_id):
+            send_temp_message(update, context, "❌ You can only check your own warning points.")
+            return
+
+        chat_id = update.effective_chat.id
+        settings = db.get_chat_settings(chat_id)
+        points = db.get_warning_points(chat_id, target_id)
+        send_temp_message(update, context,
+                          f"⚠️ Warning points for {target_id}: {points:.1f} "
+                          f"(mute at {settings.mute_threshold or 'off'}, kick at {settings.kick_threshold or 'off'}; "
+                          f"points halve every {WARN_HALF_LIFE / 3600:g}h)")
+    except Exception as e:
+        logger.error("Error in /warns command: %s", e)
+
+def resetwarns_command(update: Update, context: CallbackContext):
+    """Handle the /resetwarns command"""
+    try:
+        if not update.message:
+            return
+
+        user_id = update.effective_user.id
+        if not can_manage_chat(update, context, user_id):
+            send_temp_message(update, context, "❌ You don't have permission to reset warnings.")
+            return
+
+        target_id = _warn_target(update, context)
+        if not target_id:
+            send_temp_message(update, context, "❌ User not found. Reply to their message or use a user ID.")
+            return
+        db.reset_warning_points(update.effective_chat.id, target_id)
+        send_temp_message(update, context, f"✅ Warning points for {target_id} cleared.")
+        logger.info("Warning points for %s in chat %s reset by %s", target_id, update.effective_chat.id, user_id)
+    except Exception as e:
+        logger.error("Error in /resetwarns command: %s", e)
+
+def flush_warning_points_job(context: CallbackContext):
+    """Periodic job persisting changed warning points"""
+    try:
+        written = db.flush_warning_points()
+        if written:
+            logger.debug("Flushed %s warning point rows", written)
+    except Exception as e:
+        logger.error("Error flushing warning points: %s", e)
+
+DELETE_BATCH_SIZE = 100  # Bot API limit for deleteMessages
+
+def delete_messages(bot, chat_id: int, message_ids):
+    """Delete messages in batches of up to 100, skipping ones that are already gone or too old.
+
+    python-telegram-bot 13 predates deleteMessages, so it is called through the
+    raw API; if a batch is rejected, its messages are deleted one by one.
+    RetryAfter (flood control) is left to the caller.
+    """
+    message_ids = list(message_ids)
+    for start in range(0, len(message_ids), DELETE_BATCH_SIZE):
+        batch = message_ids[start:start + DELETE_BATCH_SIZE]
+        try:
+            bot._post('deleteMessages', {'chat_id': chat_id, 'message_ids': batch})
+        except (BadRequest, InvalidToken):
+            for message_id in batch:
+                try:
+                    bot.delete_message(chat_id, message_id)
+                except BadRequest:
+                    pass
+
+def restrict_raiders(bot, chat_id: int, user_ids):
+    """Mute members who joined during a raid"""
+    until = int(time.time()) + RAID_MUTE_DURATION
+    for user_id in user_ids:
+        try:
+            bot.restrict_chat_member(chat_id, user_id, ChatPermissions(can_send_messages=False), until_date=until)
+        except TelegramError as e:
+            logger.warning("Could not restrict raider %s in chat %s: %s", user_id, chat_id, e)
+
+def start_raid_lockdown(update: Update, context: CallbackContext, chat_id: int):
+    """Mute everyone who joined in the raid window and delete what they already posted"""
+    raiders = raid_monitor.raiders(chat_id)
+    logger.warning("Join raid in chat %s: lockdown started (%s recent joins)", chat_id, len(raiders))
+    send_temp_message(update, context, f"🚨 Join raid detected ({len(raiders)} joins in the last "
+                                       f"{RAID_WINDOW}s). Lockdown: new members are muted and their "
+                                       f"messages removed until the joins stop.")
+    restrict_raiders(context.bot, chat_id, raiders)
+    delete_messages(context.bot, chat_id, raid_monitor.take_raider_messages(chat_id))
+
+def register_joins(update: Update, context: CallbackContext, chat_id: int, users):
+    """Ban globally banned newcomers, count the rest towards raid detection and mute
+    them if the chat is already locked down"""
+    user_ids = [user.id for user in users
+                if not user.is_bot and not enforce_global_ban(context.bot, chat_id, user.id)]
+    if not user_ids:
+        return
+    if raid_monitor.record_joins(chat_id, user_ids, db.get_chat_settings(chat_id).raid_threshold):
+        start_raid_lockdown(update, context, chat_id)
+    elif raid_monitor.is_locked(chat_id):
+        restrict_raiders(context.bot, chat_id, user_ids)
+
+def purge_command(update: Update, context: CallbackContext):
+    """Handle the /purge command"""
+    try:
+        if not update.message or not is_command_allowed(update):
+            return
+
+        user_id = update.effective_user.id
+        if not can_manage_chat(update, context, user_id):
+            send_temp_message(update, context, "❌ You don't have permission to purge messages.")
+            return
+
+        chat_id = update.effective_chat.id
+        command_id = update.message.message_id
+        reply = update.message.reply_to_message
+        count = int(context.args[0]) if context.args and context.args[0].isdigit() else None
+        if reply and count is None:
+            # Everything from the replied message up to and including the command
+            if command_id - reply.message_id >= PURGE_MAX_MESSAGES:
+                send_temp_message(update, context, f"❌ A purge is limited to {PURGE_MAX_MESSAGES} messages.")
+                return
+            message_ids = list(range(command_id, reply.message_id - 1, -1))
+        elif count:
+            if reply and reply.from_user:
+                target_id = reply.from_user.id
+            elif len(context.args) > 1:
+                target_id, username = extract_user_info(context.args[1])
+                if not target_id and username:
+                    target_id = db.get_user_id_by_username(username)
+            else:
+                target_id = None
+            if not target_id:
+                send_temp_message(update, context, "❌ User not found. Reply to their message or use a user ID.")
+                return
+            message_ids = [command_id] + message_log.recent_from_user(chat_id, target_id, min(count, PURGE_MAX_MESSAGES))
+        else:
+            send_temp_message(update, context, "❌ Reply to a message with /purge, or use /purge <n> <user_id/username>.")
+            return
+
+        if chat_id in _active_purges:
+            send_temp_message(update, context, "❌ A purge is already running in this chat.")
+            return
+        _active_purges.add(chat_id)
+        try:
+            status = context.bot.send_message(chat_id=chat_id, text=f"🧹 Purging {len(message_ids)} messages...")
+            context.job_queue.run_once(purge_batch_job, 0, context={
+                'chat_id': chat_id, 'message_ids': message_ids, 'done': 0, 'status': status,
+            })
+        except Exception:
+            # Nothing was scheduled, so don't leave the chat marked as purging
+            _active_purges.discard(chat_id)
+            raise
+        logger.info("Purge of %s messages in chat %s started by %s", len(message_ids), chat_id, user_id)
+    except Exception as e:
+        logger.error("Error in /purge command: %s", e)
+
+def purge_batch_job(context: CallbackContext):
+    """Delete the next batch of a /purge and report progress in its status message"""
+    state = context.job.context
+    chat_id, message_ids, status = state['chat_id'], state['message_ids'], state['status']
+    batch = message_ids[state['done']:state['done'] + DELETE_BATCH_SIZE]
+    try:
+        delete_messages(context.bot, chat_id, batch)
+    except RetryAfter as e:
+        context.job_queue.run_once(purge_batch_job, e.retry_after, context=state)
+        return
+    except Exception as e:
+        logger.error("Error purging messages in chat %s: %s", chat_id, e)
+        _active_purges.discard(chat_id)
+        return
+
+    message_log.forget(chat_id, batch)
+    state['done'] += len(batch)
+    try:
+        if state['done'] < len(message_ids):
+            status.edit_text(f"🧹 Purging... {state['done']}/{len(message_ids)}")
+            context.job_queue.run_once(purge_batch_job, PURGE_BATCH_DELAY, context=state)
+            return
+        _active_purges.discard(chat_id)
+        status.edit_text(f"✅ Purged {len(message_ids)} messages.")
+        context.job_queue.run_once(lambda _: status.delete(), db.get_chat_settings(chat_id).warning_ttl)
+    except Exception as e:
+        _active_purges.discard(chat_id)
+        logger.error("Error updating purge status in chat %s: %s", chat_id, e)
+
+def lockdown_command(update: Update, context: CallbackContext):
+    """Handle the /lockdown command"""
+    try:
+        if not update.message:
+            return
+
+        user_id = update.effective_user.id
+        if not can_manage_chat(update, context, user_id):
+            send_temp_message(update, context, "❌ You don't have permission to change the lockdown.")
+            return
+
+        chat_id = update.effective_chat.id
+        value = context.args[0].lower() if context.args else None
+        if value == 'on':
+            if raid_monitor.start_lockdown(chat_id):
+                send_temp_message(update, context, "🚨 Lockdown on: new members are muted and warnings paused. "
+                                                   "End it with /lockdown off.")
+                restrict_raiders(context.bot, chat_id, raid_monitor.raiders(chat_id))
+                logger.info("Lockdown started in chat %s by %s", chat_id, user_id)
+            else:
+                send_temp_message(update, context, "❌ This chat is already in lockdown.")
+        elif value == 'off':
+            if raid_monitor.end_lockdown(chat_id):
+                send_temp_message(update, context, "✅ Lockdown lifted.")
+                logger.info("Lockdown ended in chat %s by %s", chat_id, user_id)
+            else:
+                send_temp_message(update, context, "❌ This chat is not in lockdown.")
+        else:
+            state = "on" if raid_monitor.is_locked(chat_id) else "off"
+            send_temp_message(update, context, f"Lockdown is {state}. Use /lockdown on|off.")
+    except Exception as e:
+        logger.error("Error in /lockdown command: %s", e)
+
+def raid_check_job(context: CallbackContext):
+    """Periodic job lifting raid lockdowns once joins have calmed down"""
+    try:
+        for chat_id in raid_monitor.check_calm():
+            logger.info("Join rate back to normal in chat %s, lockdown lifted", chat_id)
+            message = context.bot.send_message(chat_id=chat_id, text="✅ Joins are back to normal, lockdown lifted.")
+            context.job_queue.run_once(lambda _, message=message: message.delete(),
+                                       db.get_chat_settings(chat_id).warning_ttl)
+    except Exception as e:
+        logger.error("Error checking raid lockdowns: %s", e)
+
+def enforce_global_ban(bot, chat_id: int, user_id: int) -> bool:
+    """Ban a globally banned user from a chat they showed up in; False if they aren't listed"""
+    if not db.is_globally_banned(user_id):
+        return False
+    if (chat_id, user_id) in _gban_enforced:
+        return True
+    _gban_enforced.set((chat_id, user_id), True)
+    try:
+        bot.ban_chat_member(chat_id, user_id)
+        logger.info("Enforced global ban on user %s in chat %s", user_id, chat_id)
+    except TelegramError as e:
+        logger.warning("Could not enforce global ban on user %s in chat %s: %s", user_id, chat_id, e)
+    # Propagation no longer needs to visit this chat for the user
+    db.finish_global_ban_tasks([(user_id, chat_id, 'ban')], [], GBAN_MAX_ATTEMPTS)
+    return True
+
+def _gban_target(update: Update, context: CallbackContext) -> tuple[Optional[int], list]:
+    """User id for /gban and /ungban, and the remaining arguments (the reason)"""
+    user_id, username = get_user_from_message(update, context)
+    args = list(context.args or [])
+    if args and any(extract_user_info(args[0])):
+        args = args[1:]
+    if not user_id and username:
+        user_id = db.get_user_id_by_username(username)
+    return user_id, args
+
+def gban_command(update: Update, context: CallbackContext):
+    """Handle the /gban command"""
+    try:
+        if not update.message or update.effective_user.id != ADMIN_ID:
+            send_temp_message(update, context, "❌ Only the bot admin can ban users globally.")
+            return
+
+        target_id, args = _gban_target(update, context)
+        if not target_id:
+            send_temp_message(update, context, "❌ User not found. Reply to their message or use a user ID.")
+            return
+        if target_id == ADMIN_ID or db.is_sudo_user(target_id):
+            send_temp_message(update, context, "❌ The bot admin and sudo users can't be banned globally.")
+            return
+
+        reason = ' '.join(args) or None
+        queued = db.add_global_ban(target_id, reason, update.effective_user.id)
+        if queued is None:
+            send_temp_message(update, context, "❌ Failed to ban user globally.")
+            return
+        if update.effective_chat.type != Chat.PRIVATE:
+            enforce_global_ban(context.bot, update.effective_chat.id, target_id)
+        send_temp_message(update, context, f"✅ User {target_id} is banned globally; "
+                                           f"the ban is being applied in {queued} chats.")
+        logger.info("User %s banned globally by admin (%s)", target_id, reason or 'no reason')
+    except Exception as e:
+        logger.error("Error in /gban command: %s", e)
+
+def ungban_command(update: Update, context: CallbackContext):
+    """Handle the /ungban command"""
+    try:
+        if not update.message or update.effective_user.id != ADMIN_ID:
+            send_temp_message(update, context, "❌ Only the bot admin can lift global bans.")
+            return
+
+        target_id, _ = _gban_target(update, context)
+        if not target_id:
+            send_temp_message(update, context, "❌ User not found. Use a user ID.")
+            return
+
+        if not db.is_globally_banned(target_id):
+            send_temp_message(update, context, f"ℹ️ User {target_id} isn't banned globally.")
+            return
+
+        queued = db.remove_global_ban(target_id)
+        if queued is None:
+            send_temp_message(update, context, "❌ Failed to lift the global ban.")
+        else:
+            for chat_id in db.get_moderated_chats():
+                _gban_enforced.pop((chat_id, target_id))
+            send_temp_message(update, context, f"✅ Global ban on {target_id} lifted; "
+                                               f"unbanning in {queued} chats.")
+            logger.info("Global ban on user %s lifted by admin", target_id)
+    except Exception as e:
+        logger.error("Error in /ungban command: %s", e)
+
+def gbans_command(update: Update, context: CallbackContext):
+    """Handle the /gbans command"""
+    try:
+        if not update.message or update.effective_user.id != ADMIN_ID:
+            send_temp_message(update, context, "❌ Only the bot admin can view global bans.")
+            return
+
+        banned, pending = db.get_global_ban_stats()
+        text = f"🌐 Globally banned users: {banned}\n⏳ Chats still to update: {pending}"
+        paused = ban_propagator.paused_until - time.monotonic()
+        if paused > 0:
+            text += f"\n⏸️ Paused by flood control for {paused:.0f}s"
+        send_temp_message(update, context, text)
+    except Exception as e:
+        logger.error("Error in /gbans command: %s", e)
+
+def gban_propagation_job(context: CallbackContext):
+    """Periodic job applying queued global bans/unbans chat by chat"""
+    try:
+        tasks = db.get_global_ban_tasks(GBAN_BATCH_SIZE)
+        if not tasks:
+            return
+        result = ban_propagator.run(context.bot, tasks)
+        if result is None:
+            return
+        done, failed = result
+        db.finish_global_ban_tasks(done, failed, GBAN_MAX_ATTEMPTS)
+        logger.info("Global ban propagation: %s applied, %s failed, %s deferred",
+                    len(done), len(failed), len(tasks) - len(done) - len(failed))
+    except Exception as e:
+        logger.error("Error propagating global bans: %s", e)
+
+def flush_seen_users_job(context: CallbackContext):
+    """Periodic job persisting the buffered seen-users directory"""
+    try:
+        written = db.flush_seen_users()
+        if written:
+            logger.debug("Flushed %s seen user rows", written)
+    except Exception as e:
+        logger.error("Error flushing seen users: %s", e)
+
+def revoke_expired_approvals_job(context: CallbackContext):
+    """Periodic job revoking all expired approvals in one sweep"""
+    try:
+        revoked = db.revoke_expired_approvals()
+        if revoked:
+            logger.info("Revoked %s expired approvals", len(revoked))
+    except Exception as e:
+        logger.error("Error revoking expired approvals: %s", e)
+
+def is_forward_allowed(chat_id: int, settings, channel_id: int, user_id: int) -> bool:
+    """Apply the chat's channel rules and forward policy; role lookups only when the policy needs them"""
+    rules = db.get_channel_rules(chat_id)
+    if channel_id in rules['deny']:
+        return db.is_sudo_user(user_id)
+    if channel_id in rules['allow'] or settings.forward_policy == 'allow':
+        return True
+    if settings.forward_policy == 'approved':
+        return db.is_sudo_user(user_id) or db.is_user_approved(user_id)
+    return db.is_sudo_user(user_id)
+
+def find_link_violation(chat_id: int, settings, urls) -> Optional[str]:
+    """Return the offending domain among a message's links under the chat's link policy"""
+    if settings.link_policy == 'off':
+        return None
+    for url in urls:
+        host = extract_host(url)
+        if not host:
+            continue
+        match = db.match_domain(chat_id, host)
+        if match and match[1] == 'block':
+            return match[0]
+        if settings.link_policy == 'allowlist' and not (match and match[1] == 'allow'):
+            return host
+    return None
+
+def handle_chat_member(update: Update, context: CallbackContext):
+    """Keep the chat administrator cache in sync with membership changes and count joins"""
+    try:
+        if update.my_chat_member:
+            # The bot's own rights changed (added, promoted, ...), refetch lazily
+            admin_cache.invalidate(update.my_chat_member.chat.id)
+        member = update.chat_member
+        if member:
+            admin_cache.apply_update(member)
+            if (member.old_chat_member.status in (ChatMember.LEFT, ChatMember.KICKED)
+                    and member.new_chat_member.status in (ChatMember.MEMBER, ChatMember.RESTRICTED)):
+                register_joins(update, context, member.chat.id, [member.new_chat_member.user])
+    except Exception as e:
+        logger.error("Error in chat member handler: %s", e)
+
+def check_text_content(update: Update, context: CallbackContext, message, content, settings,
+                       user_id: int) -> bool:
+    """Run the text filters on a new or edited message's extracted content.
+
+    Deletes the message on a violation and returns True if it did.
+    """
+    # Check for copyright violation
+    if settings.copyright_filter and check_copyright_violation(content.normalized):
+        try:
+            message.delete()
+            send_warning(update, context, "❌ Message deleted due to potential copyright violation.")
+            record_violation(update, context, settings, user_id)
+            logger.info("Deleted message with copyright violation from user %s", user_id,
+                        extra={'event': 'copyright_deleted', 'user_id': user_id})
+        except Exception as e:
+            logger.error("Error handling copyright violation: %s", e)
+        return True
+
+    # Check the bot admin's regex filter rules
+    rule_id, disabled_rules = db.check_filter_rules(content.normalized)
+    if disabled_rules:
+        report_disabled_rules(context, disabled_rules)
+    if rule_id is not None and not db.is_sudo_user(user_id):
+        try:
+            message.delete()
+            send_warning(update, context, "❌ Message deleted: it matches a filter rule.")
+            record_violation(update, context, settings, user_id)
+            logger.info("Deleted message matching filter rule %s from user %s", rule_id, user_id,
+                        extra={'event': 'rule_deleted', 'user_id': user_id})
+        except Exception as e:
+            logger.error("Error handling filter rule match: %s", e)
+        return True
+
+    # Check links against the domain block/allow lists
+    if content.urls:
+        domain = find_link_violation(update.effective_chat.id, settings, content.urls)
+        if domain and not (db.is_sudo_user(user_id) or db.is_user_approved(user_id)):
+            db.record_domain_hit(update.effective_chat.id, domain)
+            try:
+                message.delete()
+                send_warning(update, context, "❌ Message deleted: links to this site are not allowed here.")
+                record_violation(update, context, settings, user_id)
+                logger.info("Deleted link to %s from user %s", domain, user_id,
+                            extra={'event': 'link_deleted', 'user_id': user_id})
+            except Exception as e:
+                logger.error("Error handling link message: %s", e)
+            return True
+
+    # Check mention, invite-link, caps and emoji heuristics
+    violation = check_feature_rules(content, settings)
+    if violation and not (db.is_sudo_user(user_id) or db.is_user_approved(user_id)):
+        try:
+            message.delete()
+            send_warning(update, context, f"❌ Message deleted: {violation} not allowed here.")
+            record_violation(update, context, settings, user_id)
+            logger.info("Deleted message (%s) from user %s", violation, user_id,
+                        extra={'event': 'heuristic_deleted', 'user_id': user_id})
+        except Exception as e:
+            logger.error("Error handling heuristic violation: %s", e)
+        return True
+
+    # Check the local spam classifier
+    if spam_scorer:
+        spam_score = spam_scorer.score(content.normalized)
+        if spam_score >= SPAM_THRESHOLD and not db.is_sudo_user(user_id):
+            try:
+                message.delete()
+                send_warning(update, context, "❌ Message deleted: detected as spam.")
+                record_violation(update, context, settings, user_id)
+                logger.info("Deleted spam (score %.3f) from user %s", spam_score, user_id,
+                            extra={'event': 'spam_deleted', 'user_id': user_id})
+            except Exception as e:
+                logger.error("Error handling spam message: %s", e)
+            return True
+
+    return False
 
 def handle_edited_message(update: Update, context: CallbackContext):
     """Handle edited messages"""
@@ -233,11 +1452,44 @@ def handle_edited_message(update: Update, context: CallbackContext):
         if not update.edited_message:
             return
 
-        logger.debug(f"Handling edited message: {update.edited_message.message_id}")
+        # Chat administrators may edit their messages
+        if update.edited_message.from_user and is_chat_admin(update, context, update.edited_message.from_user.id):
+            return
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Handling edited message: %s", update.edited_message.message_id,
+                         extra={'event': 'edit_received', 'sampled': True})
+
+        settings = db.get_chat_settings(update.edited_message.chat_id)
+
+        # Compare with what the message showed before: no-op edits (link previews,
+        # unchanged text) are ignored and cosmetic ones only matter under 'all'
+        message = update.edited_message
+        fingerprint = message_fingerprint(message)
+        edit_class = classify_edit(message_log.fingerprint(message.chat_id, message.message_id), fingerprint)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Edit of message %s classified as %s", message.message_id, edit_class,
+                         extra={'event': 'edit_classified', 'sampled': True})
+        if edit_class == NO_OP:
+            return
+        if not settings.delete_edits or (edit_class == COSMETIC and settings.edit_policy != 'all'):
+            # The edit is allowed, but the new text must still pass the filters a new message would
+            if not message.from_user:
+                return
+            content = extract_text_content(message)
+            if content and check_text_content(update, context, message, content, settings, message.from_user.id):
+                message_log.forget(message.chat_id, [message.message_id])
+                return
+            # Later edits are compared with this version
+            message_log.record(message.chat_id, message.message_id, message.from_user.id, fingerprint)
+            return
 
         try:
             # Delete the edited message
             update.edited_message.delete()
+            message_log.forget(message.chat_id, [message.message_id])
+            if raid_monitor.is_locked(update.edited_message.chat_id):
+                return
             # Send warning about edited messages with auto-delete
             warning = WARNING_MESSAGE.format(
                 user_name=update.edited_message.from_user.first_name
@@ -248,17 +1500,17 @@ def handle_edited_message(update: Update, context: CallbackContext):
                 parse_mode=ParseMode.HTML
             )
             
-            # Delete warning message after 30 seconds
+            # Delete warning message after the chat's warning TTL
             context.job_queue.run_once(
                 lambda _: warning_msg.delete(),
-                30,
+                settings.warning_ttl,
                 context=warning_msg.chat_id
             )
         except Exception as e:
-            logger.error(f"Error handling edited message: {e}")
+            logger.error("Error handling edited message: %s", e)
 
     except Exception as e:
-        logger.error(f"Error in edited message handler: {e}")
+        logger.error("Error in edited message handler: %s", e)
 
 def handle_message(update: Update, context: CallbackContext):
     """Handle new messages"""
@@ -267,39 +1519,124 @@ def handle_message(update: Update, context: CallbackContext):
             return
 
         user_id = update.effective_user.id
-        logger.debug(f"Handling message from user {user_id}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Handling message from user %s", user_id,
+                         extra={'event': 'message_received', 'sampled': True})
+
+        # Known spam media is removed before any other check. Owner-blocked files are
+        # removed whoever sent them; learned ones spare chat admins and sudo users.
+        file_unique_id = get_media_file_id(update.message)
+        block_source = db.get_media_block_source(file_unique_id) if file_unique_id else None
+        if block_source and not (block_source == 'auto' and (
+                user_id == ADMIN_ID or db.is_sudo_user(user_id) or is_chat_admin(update, context, user_id))):
+            try:
+                update.message.delete()
+                logger.info("Deleted blocklisted media %s from user %s", file_unique_id, user_id,
+                            extra={'event': 'blocked_media_deleted', 'user_id': user_id})
+            except Exception as e:
+                logger.error("Error deleting blocklisted media: %s", e)
+            return
 
-        # Check for media content
-        if is_media_message(update.message):
-            is_approved = db.is_user_approved(user_id)
+        chat_id = update.effective_chat.id
+        if update.effective_chat.type != Chat.PRIVATE and enforce_global_ban(context.bot, chat_id, user_id):
+            try:
+                update.message.delete()
+            except BadRequest:
+                pass
+            return
+
+        # Raid detection: count joins, silently remove what raiders post during a lockdown
+        if update.message.new_chat_members:
+            register_joins(update, context, chat_id, update.message.new_chat_members)
+        if raid_monitor.is_raider(chat_id, user_id):
+            try:
+                update.message.delete()
+            except BadRequest:
+                pass
+            return
+        raid_monitor.record_message(chat_id, user_id, update.message.message_id)
+        message_log.record(chat_id, update.message.message_id, user_id, message_fingerprint(update.message))
+
+        username = update.effective_user.username
+        db.record_seen_user(user_id, username, update.effective_chat.id)
+
+        # Bind any pending @username approvals to this user's id
+        if db.resolve_pending_username(user_id, username):
+            logger.info("Resolved pending username grants for user %s", user_id)
+
+        # Chat administrators are exempt from moderation
+        if is_chat_admin(update, context, user_id):
+            return
+
+        settings = db.get_chat_settings(update.effective_chat.id)
+
+        # Check forwards from channels against the chat's forward policy
+        forward_chat = update.message.forward_from_chat
+        if forward_chat:
+            if not is_forward_allowed(update.effective_chat.id, settings, forward_chat.id, user_id):
+                db.record_forward(update.effective_chat.id, forward_chat.id, forward_chat.title, True)
+                try:
+                    update.message.delete()
+                    send_warning(update, context, "❌ Forwards from this channel are not allowed here.")
+                    record_violation(update, context, settings, user_id)
+                    logger.info("Deleted forward from channel %s by user %s", forward_chat.id, user_id,
+                                extra={'event': 'forward_deleted', 'user_id': user_id})
+                except Exception as e:
+                    logger.error("Error handling forwarded message: %s", e)
+                return
+            db.record_forward(update.effective_chat.id, forward_chat.id, forward_chat.title, False)
+
+        # Check for media content the chat restricts; the role lookup is only
+        # needed when unapproved users may not send this kind
+        media_kind = get_media_kind(update.message)
+        if (media_kind and not media_kind & settings.unapproved_media_mask
+                and not is_allowlisted_media(update.message, db.get_media_allowlist(update.effective_chat.id))):
             is_sudo = db.is_sudo_user(user_id)
-            logger.debug(f"Media message from user {user_id}: Approved={is_approved}, Sudo={is_sudo}")
+            is_approved = not is_sudo and db.is_user_approved(user_id)
+            logger.debug("Media message from user %s: Approved=%s, Sudo=%s", user_id, is_approved, is_sudo)
 
-            if not (is_approved or is_sudo):
+            if not (is_sudo or (is_approved and media_kind & settings.approved_media_mask)):
                 try:
                     update.message.delete()
-                    send_temp_message(update, context, "❌ You need to be approved to send media content.")
-                    logger.info(f"Deleted unauthorized media message from user {user_id}")
+                    send_warning(update, context, "❌ You need to be approved to send media content.")
+                    record_violation(update, context, settings, user_id)
+                    logger.info("Deleted unauthorized media message from user %s", user_id,
+                                extra={'event': 'media_deleted', 'user_id': user_id})
+                    # Learn known-bad files from repeated deletions (not stickers or GIFs)
+                    if (file_unique_id and not media_kind & UNLEARNED_MEDIA_MASK
+                            and db.record_media_deletion(file_unique_id, update.effective_chat.id)):
+                        logger.info("Media %s deleted across chats, added to blocklist", file_unique_id)
                 except Exception as e:
-                    logger.error(f"Error handling media message: {e}")
+                    logger.error("Error handling media message: %s", e)
                 return
 
-        # Check for copyright violation
-        if update.message.text and check_copyright_violation(update.message.text):
+        # Text, caption, link targets and forward origin, shared by all text filters below
+        content = extract_text_content(update.message)
+        if not content or check_text_content(update, context, update.message, content, settings, user_id):
+            return
+
+        # Check for the same text being pasted across many chats
+        if (DUPLICATE_FILTER
+                and duplicate_detector.check(content.normalized, update.effective_chat.id)
+                and not db.is_sudo_user(user_id)):
             try:
                 update.message.delete()
-                send_temp_message(update, context, "❌ Message deleted due to potential copyright violation.")
-                logger.info(f"Deleted message with copyright violation from user {user_id}")
+                send_warning(update, context, "❌ Message deleted: the same text is being spammed across groups.")
+                record_violation(update, context, settings, user_id)
+                logger.info("Deleted near-duplicate spam from user %s", user_id,
+                            extra={'event': 'duplicate_deleted', 'user_id': user_id})
             except Exception as e:
-                logger.error(f"Error handling copyright violation: {e}")
+                logger.error("Error handling duplicate spam: %s", e)
             return
 
     except Exception as e:
-        logger.error(f"Error in message handler: {e}")
+        logger.error("Error in message handler: %s", e)
 
 def ping_command(update: Update, context: CallbackContext):
     """Handle the /ping command"""
     try:
+        if not is_command_allowed(update):
+            return
         start_time = time.time()
         message = context.bot.send_message(
             chat_id=update.effective_chat.id,
@@ -309,7 +1646,7 @@ def ping_command(update: Update, context: CallbackContext):
         response_time = round((end_time - start_time) * 1000, 2)  # Convert to milliseconds
         message.edit_text(f"🏓 Pong!\nResponse Time: {response_time}ms")
     except Exception as e:
-        logger.error(f"Error in /ping command: {e}")
+        logger.error("Error in /ping command: %s", e)
         context.bot.send_message(
             chat_id=update.effective_chat.id,
             text="❌ Error while checking bot status."
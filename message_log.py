@@ -0,0 +1,76 @@
+import threading
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+
+
+class MessageLog:
+    """Recent message ids, senders and fingerprints per chat, with a global memory cap.
+
+    Each chat keeps its newest ``per_chat`` messages. When the total exceeds
+    ``max_total``, the chat that has been quiet the longest loses its oldest
+    messages first.
+    """
+
+    def __init__(self, per_chat: int, max_total: int):
+        self.per_chat = per_chat
+        self.max_total = max_total
+        # chat_id -> {message_id: (user_id, fingerprint)}; chats ordered by last activity
+        self._chats: "OrderedDict[int, OrderedDict[int, Tuple[int, Any]]]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def record(self, chat_id: int, message_id: int, user_id: int, fingerprint: Any = None):
+        """Log a message, or replace the fingerprint of one already logged (it keeps its age)"""
+        with self._lock:
+            messages = self._chats.get(chat_id)
+            if messages is None:
+                messages = self._chats[chat_id] = OrderedDict()
+            else:
+                self._chats.move_to_end(chat_id)
+            if message_id not in messages:
+                self._total += 1
+            messages[message_id] = (user_id, fingerprint)
+            if len(messages) > self.per_chat:
+                messages.popitem(last=False)
+                self._total -= 1
+            while self._total > self.max_total:
+                oldest_chat, oldest = next(iter(self._chats.items()))
+                oldest.popitem(last=False)
+                self._total -= 1
+                if not oldest:
+                    del self._chats[oldest_chat]
+
+    def recent_from_user(self, chat_id: int, user_id: int, limit: int) -> List[int]:
+        """Ids of a user's newest ``limit`` logged messages in a chat, newest first"""
+        with self._lock:
+            messages = self._chats.get(chat_id)
+            if not messages:
+                return []
+            found = []
+            for message_id, (sender, _) in reversed(messages.items()):
+                if sender == user_id:
+                    found.append(message_id)
+                    if len(found) >= limit:
+                        break
+            return found
+
+    def fingerprint(self, chat_id: int, message_id: int) -> Optional[Any]:
+        """The fingerprint a message was logged with, or None if it isn't logged"""
+        with self._lock:
+            messages = self._chats.get(chat_id)
+            entry = messages.get(message_id) if messages else None
+            return entry[1] if entry else None
+
+    def forget(self, chat_id: int, message_ids):
+        with self._lock:
+            messages = self._chats.get(chat_id)
+            if not messages:
+                return
+            for message_id in message_ids:
+                if messages.pop(message_id, None) is not None:
+                    self._total -= 1
+            if not messages:
+                del self._chats[chat_id]
+
+    def __len__(self) -> int:
+        return self._total
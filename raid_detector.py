@@ -0,0 +1,139 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+
+class _Lockdown:
+    __slots__ = ('started', 'manual', 'members')
+
+    def __init__(self, started: float, manual: bool):
+        self.started = started
+        self.manual = manual
+        self.members: Set[int] = set()  # users who joined during the raid
+
+
+class RaidMonitor:
+    """Per-chat join-rate tracking and lockdown state.
+
+    Joins are kept per chat in a sliding ``window`` (one entry per user, so
+    the service message and the chat_member update for the same join count
+    once). Reaching a chat's threshold puts it in lockdown; it is lifted by
+    ``check_calm()`` once the join count in the window has dropped below half
+    the threshold and the lockdown has lasted ``min_lockdown`` seconds.
+
+    Messages from recent joiners are remembered for the window, so the ones
+    posted before the raid was detected can be deleted in one sweep.
+    """
+
+    def __init__(self, window: float, min_lockdown: float):
+        self.window = window
+        self.min_lockdown = min_lockdown
+        self._joins: Dict[int, "OrderedDict[int, float]"] = {}
+        self._messages: Dict[int, Deque[Tuple[float, int, int]]] = {}  # (time, user_id, message_id)
+        self._lockdowns: Dict[int, _Lockdown] = {}
+        self._thresholds: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def _expire(self, chat_id: int, now: float):
+        joins = self._joins.get(chat_id)
+        while joins:
+            user_id, joined = next(iter(joins.items()))
+            if now - joined < self.window:
+                break
+            del joins[user_id]
+        messages = self._messages.get(chat_id)
+        while messages and now - messages[0][0] >= self.window:
+            messages.popleft()
+        if not joins:
+            self._joins.pop(chat_id, None)
+        if not messages:
+            self._messages.pop(chat_id, None)
+
+    def record_joins(self, chat_id: int, user_ids: Iterable[int], threshold: int,
+                     now: Optional[float] = None) -> bool:
+        """Record new members; return True if this starts a lockdown (threshold 0 disables detection)"""
+        now = time.monotonic() if now is None else now
+        user_ids = list(user_ids)
+        with self._lock:
+            joins = self._joins.setdefault(chat_id, OrderedDict())
+            for user_id in user_ids:
+                joins.pop(user_id, None)
+                joins[user_id] = now
+            self._expire(chat_id, now)
+            lockdown = self._lockdowns.get(chat_id)
+            if lockdown is not None:
+                lockdown.members.update(user_ids)
+                return False
+            if not threshold or len(joins) < threshold:
+                return False
+            lockdown = self._lockdowns[chat_id] = _Lockdown(now, False)
+            lockdown.members.update(joins)
+            self._thresholds[chat_id] = threshold
+            return True
+
+    def start_lockdown(self, chat_id: int, now: Optional[float] = None) -> bool:
+        """Start a manual lockdown (lifted only by end_lockdown); False if one is already active"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if chat_id in self._lockdowns:
+                return False
+            lockdown = self._lockdowns[chat_id] = _Lockdown(now, True)
+            self._expire(chat_id, now)
+            lockdown.members.update(self._joins.get(chat_id, ()))
+            return True
+
+    def end_lockdown(self, chat_id: int) -> bool:
+        with self._lock:
+            self._thresholds.pop(chat_id, None)
+            return self._lockdowns.pop(chat_id, None) is not None
+
+    def is_locked(self, chat_id: int) -> bool:
+        return chat_id in self._lockdowns
+
+    def is_raider(self, chat_id: int, user_id: int) -> bool:
+        """True for users who joined during the chat's current lockdown"""
+        lockdown = self._lockdowns.get(chat_id)
+        return lockdown is not None and user_id in lockdown.members
+
+    def raiders(self, chat_id: int) -> List[int]:
+        with self._lock:
+            lockdown = self._lockdowns.get(chat_id)
+            return list(lockdown.members) if lockdown else []
+
+    def record_message(self, chat_id: int, user_id: int, message_id: int, now: Optional[float] = None):
+        """Remember a message if its sender joined within the window"""
+        joins = self._joins.get(chat_id)
+        if not joins or user_id not in joins:
+            return
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._messages.setdefault(chat_id, deque()).append((now, user_id, message_id))
+
+    def take_raider_messages(self, chat_id: int) -> List[int]:
+        """Remove and return ids of remembered messages sent by the lockdown's raiders"""
+        with self._lock:
+            lockdown = self._lockdowns.get(chat_id)
+            messages = self._messages.pop(chat_id, None)
+            if not lockdown or not messages:
+                return []
+            return [message_id for _, user_id, message_id in messages if user_id in lockdown.members]
+
+    def check_calm(self, now: Optional[float] = None) -> List[int]:
+        """End automatic lockdowns whose join rate has fallen; returns the chats released.
+
+        Also drops expired joins and messages of quiet chats, so call it periodically.
+        """
+        now = time.monotonic() if now is None else now
+        released = []
+        with self._lock:
+            for chat_id in set(self._joins) | set(self._messages):
+                self._expire(chat_id, now)
+            for chat_id, lockdown in list(self._lockdowns.items()):
+                if lockdown.manual or now - lockdown.started < self.min_lockdown:
+                    continue
+                if len(self._joins.get(chat_id, ())) * 2 < self._thresholds.get(chat_id, 0):
+                    del self._lockdowns[chat_id]
+                    self._thresholds.pop(chat_id, None)
+                    released.append(chat_id)
+        return released
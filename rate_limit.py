@@ -0,0 +1,33 @@
+import threading
+import time
+from typing import Hashable
+
+from cache import TTLCache
+
+
+class TokenBucketLimiter:
+    """Token buckets keyed by anything hashable (user id, chat id, ...).
+
+    Each key may spend ``burst`` tokens at once and regains ``rate`` tokens
+    per second. A bucket is stored as (tokens, timestamp) and expires once it
+    would be full again, since a missing bucket is the same as a full one;
+    this keeps the store down to recently active keys, at most ``maxsize``.
+    """
+
+    def __init__(self, rate: float, burst: int, maxsize: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = TTLCache(maxsize, burst / rate)
+        self._lock = threading.Lock()
+
+    def allow(self, key: Hashable, cost: float = 1.0) -> bool:
+        """Spend ``cost`` tokens from ``key``'s bucket; False if it doesn't have them"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < cost:
+                return False
+            tokens -= cost
+            self._buckets.set(key, (tokens, now), (self.burst - tokens) / self.rate)
+            return True
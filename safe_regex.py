@@ -0,0 +1,319 @@
+"""Linear-time matcher for operator-supplied filter patterns.
+
+Supports a restricted regex subset: literals, ``.``, classes (``[a-z]``,
+``[^...]``, ``\\d \\w \\s`` and their negations), groups (``(...)``,
+``(?:...)``), alternation, the quantifiers ``* + ? {n} {n,} {n,m}`` and
+``^``/``$`` at the ends of the pattern (alternatives next to an anchor must
+be grouped, as in ``^(?:a|b)$``). Backreferences, lookaround and other
+backtracking-only features are rejected. Literal and class characters are
+folded with text_pipeline.normalize_text, like the text being searched, so
+patterns may be written in any script or case. Patterns compile to a
+Thompson NFA that is simulated through a lazily built, bounded DFA cache, so
+matching time is linear in the text length whatever the pattern.
+"""
+import time
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from text_pipeline import normalize_text
+
+MAX_PATTERN_LENGTH = 500
+MAX_NFA_STATES = 2000
+MAX_REPEAT = 50
+MAX_CACHED_TRANSITIONS = 16384
+MAX_FOLDED_RANGE = 4096  # larger class ranges are used as written, without folding each character
+
+_CHAR, _SPLIT, _MATCH = 0, 1, 2
+_CLASS_ESCAPES = {
+    'd': lambda c: c.isdigit(),
+    'w': lambda c: c.isalnum() or c == '_',
+    's': lambda c: c.isspace(),
+}
+_LITERAL_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r'}
+
+
+class PatternError(ValueError):
+    """Raised for patterns outside the supported subset"""
+
+
+class BudgetExceeded(Exception):
+    """Raised when matching runs past its deadline"""
+
+
+class _CharSet:
+    __slots__ = ('chars', 'ranges', 'classes', 'negate')
+
+    def __init__(self, chars=(), ranges=(), classes=(), negate=False):
+        self.chars = frozenset(chars)
+        self.ranges = tuple(ranges)
+        self.classes = tuple(classes)  # (predicate, expected) pairs
+        self.negate = negate
+
+    def matches(self, c: str) -> bool:
+        hit = (c in self.chars
+               or any(lo <= c <= hi for lo, hi in self.ranges)
+               or any(predicate(c) == expected for predicate, expected in self.classes))
+        return hit != self.negate
+
+
+_ANY = _CharSet('\n', negate=True)
+
+
+class _Parser:
+    """Recursive-descent parser producing a small AST of tuples"""
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        self.pos = 0
+
+    def error(self, message: str):
+        raise PatternError(f"{message} at position {self.pos}")
+
+    def peek(self) -> Optional[str]:
+        return self.pattern[self.pos] if self.pos < len(self.pattern) else None
+
+    def take(self) -> str:
+        char = self.pattern[self.pos]
+        self.pos += 1
+        return char
+
+    def parse(self):
+        node = self.parse_alt()
+        if self.pos != len(self.pattern):
+            self.error("Unbalanced ')'")
+        return node
+
+    def parse_alt(self):
+        branches = [self.parse_concat()]
+        while self.peek() == '|':
+            self.take()
+            branches.append(self.parse_concat())
+        return branches[0] if len(branches) == 1 else ('alt', branches)
+
+    def parse_concat(self):
+        items = []
+        while self.peek() not in (None, '|', ')'):
+            items.append(self.parse_repeat())
+        return ('cat', items)
+
+    def parse_repeat(self):
+        atom = self.parse_atom()
+        char = self.peek()
+        if char in ('*', '+', '?'):
+            self.take()
+            low, high = {'*': (0, None), '+': (1, None), '?': (0, 1)}[char]
+        elif char == '{':
+            low, high = self.parse_braces()
+        else:
+            return atom
+        if self.peek() == '?':  # Lazy quantifiers don't change whether a match exists
+            self.take()
+        if self.peek() in ('*', '+', '{'):
+            self.error("Nested quantifier")
+        return ('rep', atom, low, high)
+
+    def parse_braces(self) -> Tuple[int, Optional[int]]:
+        end = self.pattern.find('}', self.pos)
+        if end < 0:
+            self.error("Unterminated '{'")
+        body = self.pattern[self.pos + 1:end]
+        low_text, comma, high_text = body.partition(',')
+        if not low_text.isdigit() or (high_text and not high_text.isdigit()):
+            self.error("Invalid repeat")
+        low = int(low_text)
+        high = (int(high_text) if high_text else None) if comma else low
+        if (high is not None and high < low) or max(low, high or 0) > MAX_REPEAT:
+            self.error(f"Repeat bounds must be ordered and at most {MAX_REPEAT}")
+        self.pos = end + 1
+        return low, high
+
+    def parse_atom(self):
+        char = self.take()
+        if char == '(':
+            if self.peek() == '?':
+                if self.pattern[self.pos:self.pos + 2] != '?:':
+                    self.error("Only (?:...) groups are supported")
+                self.pos += 2
+            node = self.parse_alt()
+            if self.peek() != ')':
+                self.error("Missing ')'")
+            self.take()
+            return node
+        if char == '[':
+            return ('lit', self.parse_class())
+        if char == '.':
+            return ('lit', _ANY)
+        if char == '\\':
+            return ('lit', self.parse_escape())
+        if char in '*+?{':
+            self.error("Nothing to repeat")
+        if char in '^$':
+            self.error("Anchors are only supported at the start/end of the pattern")
+        folded = normalize_text(char)
+        if len(folded) == 1:
+            return ('lit', _CharSet(folded))
+        # Ligatures and the like fold to several characters, invisible ones to none
+        return ('cat', [('lit', _CharSet(c)) for c in folded])
+
+    def parse_escape(self) -> _CharSet:
+        if self.peek() is None:
+            self.error("Trailing backslash")
+        char = self.take()
+        if char.lower() in _CLASS_ESCAPES:
+            return _CharSet(classes=[(_CLASS_ESCAPES[char.lower()], char.islower())])
+        if char in _LITERAL_ESCAPES:
+            return _CharSet(_LITERAL_ESCAPES[char])
+        if char.isalnum():
+            # \1 backreferences, \b, \A, \x.. etc. are outside the subset
+            self.error(f"Unsupported escape \\{char}")
+        return _CharSet(char)
+
+    def parse_class(self) -> _CharSet:
+        negate = self.peek() == '^'
+        if negate:
+            self.take()
+        chars, ranges, classes = set(), [], []
+        first = True
+        while True:
+            char = self.peek()
+            if char is None:
+                self.error("Unterminated '['")
+            if char == ']' and not first:
+                self.take()
+                break
+            first = False
+            self.take()
+            if char == '\\':
+                escaped = self.parse_escape()
+                chars |= escaped.chars
+                classes.extend(escaped.classes)
+                continue
+            if self.peek() == '-' and self.pattern[self.pos + 1:self.pos + 2] not in ('', ']'):
+                self.take()
+                high = self.take()
+                if high < char:
+                    self.error("Invalid range")
+                ranges.append((char, high))
+                if ord(high) - ord(char) < MAX_FOLDED_RANGE:
+                    # Searched text only holds folded characters, so add those of the range
+                    for code in range(ord(char), ord(high) + 1):
+                        folded = normalize_text(chr(code))
+                        if len(folded) == 1:
+                            chars.add(folded)
+            else:
+                folded = normalize_text(char)
+                if len(folded) > 1:
+                    self.error(f"'{char}' stands for several characters and can't be used in a class")
+                chars.update(folded)
+        return _CharSet(chars, ranges, classes, negate)
+
+
+class SafePattern:
+    """A compiled pattern with linear-time ``search``"""
+
+    def __init__(self, pattern: str):
+        if len(pattern) > MAX_PATTERN_LENGTH:
+            raise PatternError(f"Pattern longer than {MAX_PATTERN_LENGTH} characters")
+        self.pattern = pattern
+        body = pattern
+        self.anchored_start = body.startswith('^')
+        if self.anchored_start:
+            body = body[1:]
+        self.anchored_end = body.endswith('$') and not body.endswith('\\$')
+        if self.anchored_end:
+            body = body[:-1]
+
+        self._kinds: List[int] = []
+        self._sets: List[Optional[_CharSet]] = []
+        self._outs: List[Tuple[int, ...]] = []
+        match = self._add(_MATCH, None, ())
+        tree = _Parser(body).parse()
+        if (self.anchored_start or self.anchored_end) and tree[0] == 'alt':
+            # In re, '^a|b' anchors only the first branch; rather than differ, ask for a group
+            raise PatternError("Anchors can't be combined with a top-level '|'; group the alternatives, "
+                               "e.g. ^(?:a|b)")
+        self._start = self._build(tree, match)
+        self._match = match
+        self._transitions: Dict[Tuple[FrozenSet[int], str], FrozenSet[int]] = {}
+        self._initial = self._closure([self._start])
+
+    def _add(self, kind: int, charset: Optional[_CharSet], outs: Tuple[int, ...]) -> int:
+        if len(self._kinds) >= MAX_NFA_STATES:
+            raise PatternError("Pattern too complex")
+        self._kinds.append(kind)
+        self._sets.append(charset)
+        self._outs.append(outs)
+        return len(self._kinds) - 1
+
+    def _build(self, node, next_state: int) -> int:
+        """Compile an AST node so that it continues to ``next_state``; returns its start state"""
+        kind = node[0]
+        if kind == 'lit':
+            return self._add(_CHAR, node[1], (next_state,))
+        if kind == 'cat':
+            for item in reversed(node[1]):
+                next_state = self._build(item, next_state)
+            return next_state
+        if kind == 'alt':
+            return self._add(_SPLIT, None, tuple(self._build(branch, next_state) for branch in node[1]))
+        _, atom, low, high = node
+        if high is None:
+            loop = self._add(_SPLIT, None, ())
+            self._outs[loop] = (self._build(atom, loop), next_state)
+            tail = loop
+        else:
+            tail = next_state
+            for _ in range(high - low):
+                tail = self._add(_SPLIT, None, (self._build(atom, tail), next_state))
+        for _ in range(low):
+            tail = self._build(atom, tail)
+        return tail
+
+    def _closure(self, states) -> FrozenSet[int]:
+        stack = list(states)
+        seen = set(stack)
+        while stack:
+            state = stack.pop()
+            if self._kinds[state] == _SPLIT:
+                for out in self._outs[state]:
+                    if out not in seen:
+                        seen.add(out)
+                        stack.append(out)
+        return frozenset(seen)
+
+    def _step(self, current: FrozenSet[int], char: str) -> FrozenSet[int]:
+        key = (current, char)
+        cached = self._transitions.get(key)
+        if cached is not None:
+            return cached
+        targets = [self._outs[state][0] for state in current
+                   if self._kinds[state] == _CHAR and self._sets[state].matches(char)]
+        result = self._closure(targets)
+        if not self.anchored_start:
+            result = result | self._initial
+        if len(self._transitions) >= MAX_CACHED_TRANSITIONS:
+            self._transitions.clear()  # Bound memory; correctness doesn't depend on the cache
+        self._transitions[key] = result
+        return result
+
+    def search(self, text: str, deadline: Optional[float] = None) -> bool:
+        """Return True if the pattern matches anywhere in ``text``.
+
+        Pattern characters are folded when compiling, so ``text`` should be
+        text_pipeline.normalize_text output.
+
+        Raises BudgetExceeded if ``deadline``, a time.thread_time() value (this
+        thread's CPU time), passes.
+        """
+        match = self._match
+        current = self._initial
+        last = len(text) - 1
+        for index, char in enumerate(text):
+            # Like re, '$' also matches just before a final newline
+            if match in current and (not self.anchored_end or (index == last and char == '\n')):
+                return True
+            if not current:
+                return False
+            current = self._step(current, char)
+            if deadline is not None and not index & 255 and time.thread_time() > deadline:
+                raise BudgetExceeded(self.pattern)
+        return match in current
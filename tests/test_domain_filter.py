@@ -0,0 +1,33 @@
+from domain_filter import DomainTrie
+
+
+def test_match_returns_most_specific_suffix():
+    trie = DomainTrie([('example.com', 'block'), ('safe.example.com', 'allow')])
+    assert trie.match('example.com') == ('example.com', 'block')
+    assert trie.match('a.b.example.com') == ('example.com', 'block')
+    assert trie.match('x.safe.example.com') == ('safe.example.com', 'allow')
+    assert trie.match('EXAMPLE.COM.') == ('example.com', 'block')
+
+
+def test_match_ignores_partial_labels():
+    trie = DomainTrie([('example.com', 'block')])
+    assert trie.match('badexample.com') is None
+    assert trie.match('example.org') is None
+    assert trie.match('com') is None
+
+
+def test_remove_prunes_and_keeps_other_rules():
+    trie = DomainTrie([('example.com', 'block'), ('a.b.example.com', 'allow')])
+    assert trie.remove('a.b.example.com')
+    assert trie.match('a.b.example.com') == ('example.com', 'block')
+    assert not trie.remove('b.example.com')
+    assert trie.remove('example.com')
+    assert not trie
+    assert not trie.remove('example.com')
+
+
+def test_remove_parent_keeps_child():
+    trie = DomainTrie([('example.com', 'block'), ('sub.example.com', 'allow')])
+    assert trie.remove('example.com')
+    assert trie.match('x.example.com') is None
+    assert trie.match('sub.example.com') == ('sub.example.com', 'allow')
@@ -0,0 +1,60 @@
+from datetime import datetime
+
+from telegram import Chat, Message, MessageEntity, PhotoSize, User
+
+from edit_diff import (
+    COSMETIC, CONTENT_SWAP, MEDIA_SWAP, NO_OP, UNKNOWN, classify_edit, message_fingerprint
+)
+
+_USER = User(1, 'user', False)
+_CHAT = Chat(-1, 'group')
+
+
+def fingerprint(text=None, caption=None, photo_id=None, entities=None):
+    photo = [PhotoSize('file', photo_id, 1, 1)] if photo_id else None
+    return message_fingerprint(Message(1, datetime.now(), _CHAT, from_user=_USER, text=text,
+                                       caption=caption, photo=photo, entities=entities))
+
+
+def classify(before, after):
+    return classify_edit(fingerprint(**before), fingerprint(**after))
+
+
+def test_unchanged_message_is_no_op():
+    assert classify({'text': 'hello world'}, {'text': 'hello world'}) == NO_OP
+
+
+def test_case_and_spacing_are_cosmetic():
+    assert classify({'text': 'hello world'}, {'text': 'Hello   WORLD'}) == COSMETIC
+
+
+def test_punctuation_around_words_and_emoji_are_cosmetic():
+    assert classify({'text': 'hello, world!'}, {'text': 'hello world 👋'}) == COSMETIC
+
+
+def test_formatting_change_is_cosmetic():
+    bold = [MessageEntity(MessageEntity.BOLD, 0, 5)]
+    assert classify({'text': 'hello world'}, {'text': 'hello world', 'entities': bold}) == COSMETIC
+
+
+def test_punctuation_inside_words_is_content():
+    assert classify({'text': 'price 10.5'}, {'text': 'price 105'}) == CONTENT_SWAP
+    assert classify({'text': 'visit good-site.com'}, {'text': 'visit goodsite.com'}) == CONTENT_SWAP
+
+
+def test_different_words_are_a_content_swap():
+    assert classify({'text': 'hello world'}, {'text': 'buy crypto'}) == CONTENT_SWAP
+
+
+def test_hidden_link_target_change_is_a_content_swap():
+    before = {'text': 'hello', 'entities': [MessageEntity(MessageEntity.TEXT_LINK, 0, 5, url='https://a.com')]}
+    after = {'text': 'hello', 'entities': [MessageEntity(MessageEntity.TEXT_LINK, 0, 5, url='https://b.com')]}
+    assert classify(before, after) == CONTENT_SWAP
+
+
+def test_replaced_attachment_is_a_media_swap():
+    assert classify({'caption': 'x', 'photo_id': 'one'}, {'caption': 'x', 'photo_id': 'two'}) == MEDIA_SWAP
+
+
+def test_unknown_original():
+    assert classify_edit(None, fingerprint(text='hello')) == UNKNOWN
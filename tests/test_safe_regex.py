@@ -0,0 +1,49 @@
+import random
+import re
+
+import pytest
+
+from safe_regex import BudgetExceeded, PatternError, SafePattern
+from text_pipeline import normalize_text
+
+PATTERNS = [
+    'abc', 'a|b', 'a*b', '(a|b)*c', 'a+b+', 'ab?c', '^ab', 'bc$', '^a.c$', '[a-c]+d',
+    '[^ab]c', r'\d+', r'\w\s\w', r'a\.b', 'a{2}', 'a{1,3}b', 'a{2,}', '(?:ab)+c',
+    '(a|ab)(c|bcd)', 'x.y', r'[\d.]+', '(free|cheap) (crypto|usdt)', '^$', 'a*',
+    '^(?:ab|c)', '(?:a|bc)$', '^(a|b)+$',
+]
+ALPHABET = 'abcdxy .1\n'
+
+
+@pytest.mark.parametrize('pattern', PATTERNS)
+def test_search_agrees_with_re(pattern):
+    compiled = SafePattern(pattern)
+    expected = re.compile(pattern)
+    rng = random.Random(pattern)
+    for _ in range(300):
+        text = ''.join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 12)))
+        assert compiled.search(text) == bool(expected.search(text)), repr(text)
+
+
+@pytest.mark.parametrize('pattern', [r'(a)\1', '(?=a)', '(?<!a)b', r'\bword', 'a**', '(ab', 'ab)', '[ab', '*a',
+                                     'a{3,1}', 'a{99}', 'a^b', '^ab|c', 'a|bc$'])
+def test_unsupported_patterns_rejected(pattern):
+    with pytest.raises(PatternError):
+        SafePattern(pattern)
+
+
+def test_pattern_characters_are_folded_like_text():
+    assert SafePattern('привет').search(normalize_text('привет всем'))
+    assert SafePattern('Ｆree').search(normalize_text('free'))
+    assert SafePattern('[А-Я]+т').search(normalize_text('ПРИВЕТ'))
+    assert SafePattern('FREE').search(normalize_text('Free'))
+
+
+def test_backtracking_pattern_runs_in_linear_time():
+    assert not SafePattern('(a*)*b').search('a' * 5000)
+    assert not SafePattern('(a|aa)+$').search('a' * 5000 + '!')
+
+
+def test_deadline_raises():
+    with pytest.raises(BudgetExceeded):
+        SafePattern('z').search('a' * 10000, deadline=0)
@@ -0,0 +1,146 @@
+import re
+import unicodedata
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple
+
+from telegram import Message, MessageEntity
+
+# Letters from other scripts that render like Latin ones (lowercase targets).
+# NFKC already folds fullwidth and mathematical alphanumerics; this covers
+# what it leaves alone, e.g. the Cherokee/Armenian letters in config.BOT_NAME.
+_CONFUSABLES = {
+    'a': 'аαΑАᎪ', 'b': 'ВβΒᏴ', 'c': 'сСϲᏟ', 'd': 'ԁᎠ', 'e': 'еЕεΕᎬ',
+    'g': 'ɡցᏀ', 'h': 'һНΗᎻհ', 'i': 'іІιΙӏᏆ', 'j': 'јЈᎫ', 'k': 'кКκΚᏦ',
+    'l': 'ӀᏞ', 'm': 'мМΜᎷ', 'n': 'ΝոՌ', 'o': 'оОοΟօՕ', 'p': 'рРρΡᏢ',
+    'q': 'ԛ', 'r': 'Ꭱ', 's': 'ѕЅՏᏚ', 't': 'тТτΤͲᎢ', 'u': 'υՍսႮ', 'v': 'νᏙ',
+    'w': 'ԝᎳ', 'x': 'хХχΧ', 'y': 'уУΥᎽ', 'z': 'ΖᏃ',
+}
+
+# Invisible characters used to split words: zero-width spaces/joiners,
+# direction marks, soft hyphen, BOM and combining marks ("zalgo" text)
+_STRIPPED_RANGES = (
+    (0x00AD, 0x00AD), (0x034F, 0x034F), (0x061C, 0x061C), (0x115F, 0x1160),
+    (0x17B4, 0x17B5), (0x180B, 0x180E), (0x200B, 0x200F), (0x202A, 0x202E),
+    (0x2060, 0x206F), (0x3164, 0x3164), (0xFE00, 0xFE0F), (0xFEFF, 0xFEFF),
+    (0xFFA0, 0xFFA0), (0x0300, 0x036F), (0x1AB0, 0x1AFF), (0x1DC0, 0x1DFF),
+    (0x20D0, 0x20FF), (0xFE20, 0xFE2F),
+)
+
+_FOLD_TABLE = {ord(char): latin for latin, chars in _CONFUSABLES.items() for char in chars}
+_FOLD_TABLE.update({code: None for start, end in _STRIPPED_RANGES for code in range(start, end + 1)})
+
+
+@lru_cache(maxsize=4096)
+def normalize_text(text: str) -> str:
+    """Fold text for filtering: NFKC, confusable letters to Latin, invisible characters removed, lowercased.
+
+    Cached because spam is, by nature, the same strings over and over.
+    """
+    return unicodedata.normalize('NFKC', text).translate(_FOLD_TABLE).casefold()
+
+
+_INVITE_LINK_RE = re.compile(r'(?:^|//|\.|\b)(?:t|telegram)\.(?:me|dog)/(?:joinchat/|\+)', re.IGNORECASE)
+_MENTION_TYPES = (MessageEntity.MENTION, MessageEntity.TEXT_MENTION)
+
+
+class MessageFeatures(NamedTuple):
+    """Counts every spam heuristic works from, gathered in a single walk of the text and entities"""
+    letters: int = 0
+    uppercase: int = 0
+    emoji: int = 0
+    mentions: int = 0
+    invite_links: int = 0
+
+    @property
+    def caps_percent(self) -> int:
+        return 100 * self.uppercase // self.letters if self.letters else 0
+
+    def emoji_percent(self, length: int) -> int:
+        return 100 * self.emoji // length if length else 0
+
+
+class TextContent(NamedTuple):
+    """All filterable text of a message, extracted once and shared by every text rule"""
+    body: str                   # message text or media caption
+    urls: Tuple[str, ...]       # URLs from url/text_link entities (text_link targets are hidden in the body)
+    forward_origin: str         # title/username/name of the forwarded source, if any
+    combined: str               # everything above joined
+    normalized: str             # normalize_text(combined), what text filters scan
+    features: MessageFeatures   # counts for the heuristic rules
+
+    def __bool__(self) -> bool:
+        return bool(self.combined)
+
+
+EMPTY_TEXT = TextContent('', (), '', '', '', MessageFeatures())
+
+
+def _is_emoji(code: int) -> bool:
+    return 0x1F000 <= code <= 0x1FAFF or 0x2600 <= code <= 0x27BF or 0x2B00 <= code <= 0x2BFF
+
+
+def extract_text_content(message: Message) -> TextContent:
+    """Collect text, caption, entity URLs, forward origin and heuristic counts of a message in one pass"""
+    if message.text:
+        body, entities, parse = message.text, message.entities, message.parse_entity
+    elif message.caption:
+        body, entities, parse = message.caption, message.caption_entities, message.parse_caption_entity
+    else:
+        body, entities, parse = '', (), None
+
+    urls = []
+    mentions = invite_links = 0
+    for entity in entities or ():
+        if entity.type in _MENTION_TYPES:
+            mentions += 1
+        elif entity.type == MessageEntity.URL or entity.type == MessageEntity.TEXT_LINK:
+            url = entity.url if entity.type == MessageEntity.TEXT_LINK else parse(entity)
+            urls.append(url)
+            if _INVITE_LINK_RE.search(url):
+                invite_links += 1
+
+    letters = uppercase = emoji = 0
+    for char in body:
+        if char.isalpha():
+            letters += 1
+            if char.isupper():
+                uppercase += 1
+        elif _is_emoji(ord(char)):
+            emoji += 1
+
+    origin_parts = []
+    forward_chat = message.forward_from_chat
+    if forward_chat:
+        origin_parts.extend(filter(None, (forward_chat.title, forward_chat.username)))
+    if message.forward_from:
+        origin_parts.extend(filter(None, (message.forward_from.full_name, message.forward_from.username)))
+    if message.forward_sender_name:
+        origin_parts.append(message.forward_sender_name)
+    forward_origin = ' '.join(origin_parts)
+
+    if not (body or urls or forward_origin):
+        return EMPTY_TEXT
+    # Visible URLs are already part of the body; only hidden text_link targets add new text
+    hidden_urls = [url for url in urls if url not in body]
+    combined = '\n'.join(filter(None, [body, *hidden_urls, forward_origin]))
+    features = MessageFeatures(letters, uppercase, emoji, mentions, invite_links)
+    return TextContent(body, tuple(urls), forward_origin, combined, normalize_text(combined), features)
+
+
+def check_feature_rules(content: TextContent, settings) -> Optional[str]:
+    """Apply a chat's heuristic thresholds to a message's features; return the violated rule, if any.
+
+    ``settings`` is a database.ChatSettings; a threshold of 0 disables its rule.
+    """
+    features = content.features
+    if settings.block_invite_links and features.invite_links:
+        return 'invite link'
+    if settings.max_mentions and features.mentions > settings.max_mentions:
+        return 'mass mentions'
+    # Short messages ("OK", "LOL") are naturally all caps or all emoji
+    if settings.max_caps_percent and features.letters >= 20 and features.caps_percent > settings.max_caps_percent:
+        return 'excessive caps'
+    if (settings.max_emoji_percent and len(content.body) >= 20
+            and features.emoji_percent(len(content.body)) > settings.max_emoji_percent):
+        return 'excessive emoji'
+    return None
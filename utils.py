@@ -17,15 +17,93 @@ def extract_user_info(text: str) -> Tuple[Union[int, None], Union[str, None]]:
 
     return user_id, username
 
-def is_media_message(message) -> bool:
-    """Check if message contains media content"""
-    return any([
-        message.sticker,
-        message.animation,
-        message.video,
-        message.photo,
-        message.document
-    ])
+_DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+def parse_duration(text: str) -> Union[int, None]:
+    """Parse a duration like '30m', '24h' or '7d' into seconds"""
+    match = re.fullmatch(r'(\d+)([smhdw])', text.strip().lower())
+    if not match:
+        return None
+    return int(match.group(1)) * _DURATION_UNITS[match.group(2)]
+
+# Media kinds the bot can classify, in the order they are checked. Order matters:
+# animations also carry a document, so they must be matched before it.
+MEDIA_KINDS = (
+    'sticker', 'animation', 'video', 'photo', 'document', 'voice', 'video_note',
+    'audio', 'contact', 'location', 'poll', 'dice'
+)
+MEDIA_BITS = {kind: 1 << index for index, kind in enumerate(MEDIA_KINDS)}
+ALL_MEDIA_MASK = (1 << len(MEDIA_KINDS)) - 1
+# Kinds restricted before media policy became configurable
+DEFAULT_BLOCKED_MEDIA_MASK = (
+    MEDIA_BITS['sticker'] | MEDIA_BITS['animation'] | MEDIA_BITS['video']
+    | MEDIA_BITS['photo'] | MEDIA_BITS['document']
+)
+# Kinds never auto-learned as known-bad media: everyone sending a given sticker or GIF
+# sends the same file_unique_id, so repeated deletions don't single out spam
+UNLEARNED_MEDIA_MASK = MEDIA_BITS['sticker'] | MEDIA_BITS['animation']
+_MEDIA_ATTRS = tuple(MEDIA_BITS.items())
+
+def get_media_kind(message) -> int:
+    """Classify a message's media as a single MEDIA_BITS bit (0 if none)"""
+    for kind, bit in _MEDIA_ATTRS:
+        if getattr(message, kind, None):
+            return bit
+    return 0
+
+# Media attributes that carry a downloadable file, checked in MEDIA_KINDS order
+_FILE_MEDIA_ATTRS = ('sticker', 'animation', 'video', 'photo', 'document', 'voice', 'video_note', 'audio')
+
+def get_media_file_id(message) -> Union[str, None]:
+    """Return the file_unique_id of a message's media (largest photo size), if any"""
+    for attr in _FILE_MEDIA_ATTRS:
+        media = getattr(message, attr, None)
+        if media:
+            if attr == 'photo':
+                media = media[-1]
+            return media.file_unique_id
+    return None
+
+def get_allowlist_key(message) -> Tuple[Union[str, None], Union[str, None]]:
+    """Return the (kind, value) a media allowlist is keyed by for this message.
+
+    Stickers are allowed by set name, animations by file_unique_id.
+    """
+    if message.sticker:
+        return ('sticker_set', message.sticker.set_name) if message.sticker.set_name else (None, None)
+    if message.animation:
+        return 'animation', message.animation.file_unique_id
+    return None, None
+
+def is_allowlisted_media(message, allowlist: dict) -> bool:
+    """Check a sticker/animation against a chat's allowlist (two hash lookups at most)"""
+    if not allowlist:
+        return False
+    kind, value = get_allowlist_key(message)
+    return kind is not None and value in allowlist.get(kind, ())
+
+def media_mask(kinds) -> int:
+    """Build a bitmask from media kind names"""
+    mask = 0
+    for kind in kinds:
+        mask |= MEDIA_BITS[kind]
+    return mask
+
+def media_kinds(mask: int) -> list:
+    """List the media kind names set in a bitmask"""
+    return [kind for kind, bit in _MEDIA_ATTRS if mask & bit]
+
+def parse_media_mask(text: str) -> Union[int, None]:
+    """Parse 'all', 'none' or a comma-separated list of media kinds into a bitmask"""
+    text = text.strip().lower()
+    if text == 'all':
+        return ALL_MEDIA_MASK
+    if text == 'none':
+        return 0
+    kinds = [kind.strip() for kind in text.split(',') if kind.strip()]
+    if not kinds or any(kind not in MEDIA_BITS for kind in kinds):
+        return None
+    return media_mask(kinds)
 
 def is_edited_message(message) -> bool:
     """Check if message is edited"""